@@ -1,10 +1,25 @@
 from flask import Blueprint, jsonify
 
+from db.passwords import HashPoolFull
+from db.shared import db
+from db.writes import WriteQueueTimeout
+
 api = Blueprint("api", __name__)
 
-from . import auth, posts
+from . import auth, metrics, posts, tags
 
 
 @api.errorhandler(404)
 def handle_bad_request(e):
     return jsonify({"error": "The route is not defined"})
+
+
+@api.errorhandler(HashPoolFull)
+@api.errorhandler(WriteQueueTimeout)
+def handle_busy(e):
+    db.session.rollback()
+    return (
+        jsonify({"error": "Server is busy, please try again shortly."}),
+        503,
+        {"Retry-After": "1"},
+    )
@@ -1,12 +1,13 @@
-import os
 from datetime import datetime, timedelta
-from flask import jsonify, request
+from flask import current_app, jsonify, request
 from sqlalchemy.exc import NoResultFound, IntegrityError
 import jwt
 
 from api import api
-from db.models.user import User
-from db.shared import db
+from db.models.user import User, create_password, create_salt
+from db.passwords import HashPoolFull
+from db.writes import WriteQueueTimeout, writes
+from middlewares import token_cache
 
 
 @api.route("/register", methods=["POST"])
@@ -25,18 +26,23 @@ def register():
     if len(password) < 6:
         return jsonify({"error": "Password must be at least 6 characters"}), 400
 
+    # hash on this thread (through the hashing pool) so the write itself is a plain insert.
+    salt = create_salt()
+    password_hash = create_password(password, salt)
+
     try:
-        user = User(username=username, password=password)
-        db.session.add(user)
-        db.session.commit()
+        user_id = writes.submit(
+            User.insert_hashed,
+            username,
+            password_hash.decode("ascii"),
+            salt.decode("ascii"),
+        )
     except IntegrityError:
         return jsonify({"error": "User with provided username already exists"}), 401
-    except ValueError:
-        return jsonify({"error": "Validation error"}), 401
 
     token = jwt.encode(
-        {"id": user.id, "exp": datetime.now() + timedelta(days=1)},
-        os.environ.get("SESSION_SECRET"),
+        {"id": user_id, "exp": datetime.now() + timedelta(days=1)},
+        current_app.config["SESSION_SECRET"],
         algorithm="HS256",
     )
 
@@ -65,9 +71,26 @@ def login():
     if not user.correct_password(password):
         return jsonify({"error": "Wrong username and/or password"}), 401
 
+    # upgrade hashes made with an older, lower BCRYPT_ROUNDS while the plain text is at hand.
+    # best effort: when the hashing pool or the write queue is busy a later login upgrades it.
+    if user.needs_rehash():
+        try:
+            salt = create_salt()
+            password_hash = create_password(password, salt)
+            writes.submit(
+                User.update_hashed,
+                user.id,
+                password_hash.decode("ascii"),
+                salt.decode("ascii"),
+            )
+        except (HashPoolFull, WriteQueueTimeout):
+            pass
+        else:
+            token_cache.invalidate_tag(("user", user.id))
+
     token = jwt.encode(
         {"id": user.id, "exp": datetime.now() + timedelta(days=1)},
-        os.environ.get("SESSION_SECRET"),
+        current_app.config["SESSION_SECRET"],
         algorithm="HS256",
     )
 
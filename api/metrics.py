@@ -0,0 +1,18 @@
+from flask import g, abort
+
+import metrics
+from api import api
+from middlewares import auth_required
+
+
+@api.get("/metrics")
+@auth_required
+def get_metrics():
+    """
+    Accepts a GET request.
+    Returns the counters of the in-process caches and worker pools as a JSON payload.
+    """
+    if g.get("user") is None:
+        return abort(401)
+
+    return metrics.snapshot(), 200
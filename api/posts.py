@@ -1,16 +1,167 @@
-from flask import jsonify, request, g, abort, Response
-from random import randint
+import base64
+import binascii
+import hashlib
+import json
+
+from flask import current_app, jsonify, request, g, abort, Response
+from flask import json as flask_json
 
 from api import api
 from db.models.user import User
 from db.shared import db
-from db.models.user_post import UserPost
-from db.models.post import Post
-
-from db.utils import row_to_dict
+from db.models.user_post import OwnerRequired, UserPost
+from db.models.post import POST_FIELDS, Post
+from db.models.role import Permission, Role
+from db.writes import writes
+from db.counters import counters
+
+import compression
+import response_cache
 from middlewares import auth_required
 
 VALID_SORTS = ["id", "reads", "likes", "popularity"]
+VALID_TAG_MODES = ["any", "all"]
+# related data that can be embedded in each post: "authors" adds authorIds, "authorNames" the usernames.
+VALID_INCLUDES = ["authors", "authorNames"]
+MAX_PAGE_LIMIT = 1000
+
+
+def encode_cursor(post, sortBy, direction):
+    """
+    Builds the opaque nextCursor value pointing just past the given post.
+    The cursor remembers the sort it was issued for so it cannot be replayed against another one.
+    """
+    payload = [sortBy, direction, getattr(post, sortBy), post.id]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sortBy, direction):
+    """
+    Returns the (sortBy value, id) pair stored in a cursor made by encode_cursor.
+    Raises ValueError if the cursor is malformed or was issued for a different sort.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, cursor_direction, value, post_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+
+    if cursor_sort != sortBy or cursor_direction != direction:
+        raise ValueError("Cursor does not match sortBy and direction")
+    # bool is a subclass of int, true and false are neither ids nor sort values.
+    if isinstance(post_id, bool) or not isinstance(post_id, int):
+        raise ValueError("Malformed cursor")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("Malformed cursor")
+
+    return value, post_id
+
+
+def parse_fields(value):
+    """
+    Parses the fields query parameter, a comma separated subset of POST_FIELDS.
+    :returns: the requested fields in POST_FIELDS order, or None for every field if value is empty.
+    Raises ValueError if a field is unknown.
+    """
+    if not value:
+        return None
+    requested = set(value.split(","))
+    if not requested <= set(POST_FIELDS):
+        raise ValueError("Unknown field")
+    return [field for field in POST_FIELDS if field in requested]
+
+
+def invalid_fields_response():
+    return (
+        jsonify(
+            {
+                "error": f"Invalid fields passed. Must be a comma separated list of {POST_FIELDS}"
+            }
+        ),
+        400,
+    )
+
+
+def parse_include(value):
+    """
+    Parses the include query parameter, a comma separated subset of VALID_INCLUDES.
+    :returns: the requested includes as a sorted list, empty if value is empty.
+    Raises ValueError if an include is unknown.
+    """
+    if not value:
+        return []
+    requested = set(value.split(","))
+    if not requested <= set(VALID_INCLUDES):
+        raise ValueError("Unknown include")
+    return sorted(requested)
+
+
+def invalid_include_response():
+    return (
+        jsonify(
+            {
+                "error": f"Invalid include passed. Must be a comma separated list of {VALID_INCLUDES}"
+            }
+        ),
+        400,
+    )
+
+
+def serialize_posts(posts, fields, include):
+    """serializes a page of posts loaded with the given fields and, if anything is included, their authors"""
+    serializer = Post.serializer(fields, "authors" in include, "authorNames" in include)
+    return serializer.serialize_many(posts)
+
+
+def render_posts(posts, fields, include):
+    """
+    Returns the JSON array of the serialized posts, assembled from the encoded fragment of each post.
+    posts need only id and version loaded. Fragments are taken from response_cache.post_fragments and
+    only the posts missing there are loaded, with one query, serialized and encoded.
+    """
+    fragments = {}
+    missing = []
+    for post in posts:
+        fragment = response_cache.post_fragments.get(
+            response_cache.fragment_key(post.id, post.version, fields, include)
+        )
+        if fragment is None:
+            missing.append(post.id)
+        else:
+            fragments[post.id] = fragment
+
+    if missing:
+        loaded = Post.get_posts_by_ids(missing, fields, authors=bool(include))
+        for post, serialized in zip(loaded, serialize_posts(loaded, fields, include)):
+            fragment = flask_json.dumps(serialized, separators=(",", ":"))
+            # keyed by the version just loaded, which is newer than the page's if the post was written since.
+            response_cache.store_fragment(
+                response_cache.fragment_key(post.id, post.version, fields, include),
+                fragment,
+            )
+            fragments[post.id] = fragment
+
+    return "[" + ",".join(fragments[post.id] for post in posts) + "]"
+
+
+def encode_object(members):
+    """assembles a JSON object from already encoded member values, byte for byte as jsonify would"""
+    names = sorted(members) if current_app.config["JSON_SORT_KEYS"] else members
+    return (
+        "{"
+        + ",".join(flask_json.dumps(name) + ":" + members[name] for name in names)
+        + "}\n"
+    )
+
+
+def posts_etag(query_key, versions):
+    """
+    Builds the strong ETag of a GET /api/posts response from its normalized query and the posts_version
+    of each requested author. Any write to a post of those authors bumps a version and changes the tag.
+    """
+    raw = repr((query_key, [tuple(version) for version in versions]))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
 
 
 @api.post("/posts")
@@ -27,20 +178,132 @@ def posts():
     if text is None:
         return jsonify({"error": "Must provide text for the new post"}), 400
 
-    # Create new post
-    post_values = {"text": text}
-    if tags:
-        post_values["tags"] = tags
+    # Create new post. the post and its author row are written in one flush and one commit.
+    post_id = writes.submit(Post.create, user.id, text, tags)
+    response_cache.invalidate_authors([user.id])
+    post = Post.get_post_by_post_id(post_id)
 
-    post = Post(**post_values)
-    db.session.add(post)
-    db.session.commit()
+    return post.serialize(), 200
 
-    user_post = UserPost(user_id=user.id, post_id=post.id)
-    db.session.add(user_post)
-    db.session.commit()
 
-    return row_to_dict(post), 200
+@api.post("/posts/bulk")
+@auth_required
+def bulk_posts():
+    """
+    Accepts a POST request with a JSON array of posts and creates all of them in one transaction.
+    The requestor becomes the owner of every post, listed co-authors get DEFAULT_AUTHOR_ROLE.
+
+    :param text: (str) required body of each post.
+    :param tags: list(str) optional tags of each post.
+    :param authorIds: list(int) optional co-author ids of each post.
+    :returns: JSON object in the format {"ids":[(int),[...]]} with the new ids in request order, HTTPResponseCode
+    :returns: JSON object in the format {"error":"<error message"}
+    """
+    user = g.get("user")
+    if user is None:
+        return abort(401)
+
+    data = request.get_json(force=True)
+    if not isinstance(data, list) or len(data) == 0:
+        return jsonify({"error": "Must pass a non-empty array of posts."}), 400
+    max_posts = current_app.config["BULK_MAX_POSTS"]
+    if len(data) > max_posts:
+        return (
+            jsonify({"error": f"Cannot create more than {max_posts} posts at once."}),
+            400,
+        )
+
+    new_posts = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            return jsonify({"error": f"posts[{index}]: Must pass an object."}), 400
+        text = item.get("text", None)
+        tags = item.get("tags", [])
+        author_ids = item.get("authorIds", [])
+        if not isinstance(text, str) or len(text) == 0:
+            return (
+                jsonify(
+                    {"error": f"posts[{index}]: Must provide text for the new post"}
+                ),
+                400,
+            )
+        if not isinstance(tags, list) or not all(
+            isinstance(tag, str) and len(tag) > 0 for tag in tags
+        ):
+            return (
+                jsonify(
+                    {"error": f"posts[{index}]: Must pass a list of strings for tags."}
+                ),
+                400,
+            )
+        # bool is a subclass of int, true and false are not ids.
+        if not isinstance(author_ids, list) or not all(
+            isinstance(author_id, int) and not isinstance(author_id, bool)
+            for author_id in author_ids
+        ):
+            return (
+                jsonify(
+                    {
+                        "error": f"posts[{index}]: Must pass a list of integers for authorIds."
+                    }
+                ),
+                400,
+            )
+        new_posts.append({"text": text, "tags": tags, "author_ids": author_ids})
+
+    # validate the co-authors of every post with one query.
+    missing_ids = User.missing_user_ids(
+        {author_id for new_post in new_posts for author_id in new_post["author_ids"]}
+    )
+    if missing_ids:
+        return (
+            jsonify(
+                {
+                    "error": f"The users referenced by ids ({', '.join(str(i) for i in sorted(missing_ids))}) do not exist. Cannot add as authors."
+                }
+            ),
+            400,
+        )
+
+    ids = writes.submit(Post.bulk_create, new_posts, user.id)
+    response_cache.invalidate_authors(
+        {user.id, *(i for new_post in new_posts for i in new_post["author_ids"])}
+    )
+
+    return jsonify({"ids": ids}), 200
+
+
+@api.post("/posts/<int:post_id>/like")
+@auth_required
+def like_post(post_id):
+    """
+    Accepts a POST request and adds one like to the post. The increment is buffered and written
+    within COUNTER_FLUSH_INTERVAL seconds, see db.counters.
+    :returns: JSON object in the format {"id":(int)}, HTTPResponseCode 202
+    """
+    return increment_counter(post_id, "likes")
+
+
+@api.post("/posts/<int:post_id>/read")
+@auth_required
+def read_post(post_id):
+    """
+    Accepts a POST request and adds one read to the post. The increment is buffered and written
+    within COUNTER_FLUSH_INTERVAL seconds, see db.counters.
+    :returns: JSON object in the format {"id":(int)}, HTTPResponseCode 202
+    """
+    return increment_counter(post_id, "reads")
+
+
+def increment_counter(post_id, field):
+    if g.get("user") is None:
+        return abort(401)
+
+    if not Post.exists(post_id):
+        return jsonify({"error": f"Post with id {post_id} could not be found."}), 404
+
+    counters.increment(post_id, field)
+    return jsonify({"id": post_id}), 202
 
 
 @api.get("/posts")
@@ -53,7 +316,16 @@ def get_posts():
     :param authorIds: (str) Comma separated list of integers, as a string e.g. "1,5"
     :param sortBy: (str) field name to sort by. Options are "id, reads, likes, popularity. Default is "id".
     :param direction: (str) Sorting direction of results. Options are "asc" and "desc". Default is "asc".
+    :param limit: (int) optional page size, at most MAX_PAGE_LIMIT. Enables pagination.
+    :param cursor: (str) optional nextCursor value returned with the previous page. Enables pagination.
+    :param tags: (str) optional comma separated list of tag names e.g. "travel,spa". Only posts with matching tags are returned.
+    :param tagMode: (str) "any" to match posts with at least one of the tags, "all" for posts with every tag. Default is "any".
+    :param fields: (str) optional comma separated list of post fields to return e.g. "id,likes". Default is every field.
+        Columns of fields left out are not read from the database.
+    :param include: (str) optional comma separated list of VALID_INCLUDES e.g. "authors,authorNames".
+        The authors of the whole page are loaded with one batched query.
     :returns: JSON object in the format {"posts":{"id":(int),"likes":(int),"popularity":(float),"reads":(int),"tags":[(str),(str),[...]],"text":(str)},[...]}, HTTPResponseCode
+    :returns: when paginating, the same object with "nextCursor":(str) added, null on the last page.
     :returns: JSON object in the format {"error":"<error message"}
     """
     # check for validation
@@ -94,8 +366,6 @@ def get_posts():
             400,
         )
 
-    print(f"authorIds: {authorIds}")
-
     # default to "id", error if passed value not valid.
     sortBy = args.get("sortBy")
     if sortBy is None:
@@ -108,8 +378,6 @@ def get_posts():
             400,
         )
 
-    print(f"Sort by: {sortBy}")
-
     # default to ascending, error if passed value not valid.
     direction = args.get("direction")
     if direction is None:
@@ -124,53 +392,263 @@ def get_posts():
             400,
         )
 
-    print(f"Direction: {direction}")
-
-    # get matching posts
-    matched_posts = set()  # use a set to automagically remove duplicates
-    for author_id in authorIds:
-        matched_posts.update(Post.get_posts_by_user_id(author_id))
-    matched_posts = list(matched_posts)
-
-    # sort matching posts using specified sort criteria and direction.
-    # This can probably be a part of the posts model
-    # for this coding exercise it works here.
-    def sort_posts_by_criteria(posts_to_sort, criteria) -> list:
-        def compare(this, that, criteria):
-            if getattr(this, criteria) < getattr(that, criteria):
-                return -1
-            if getattr(this, criteria) > getattr(that, criteria):
-                return 1
-            if getattr(this, criteria) == getattr(that, criteria):
-                if getattr(this, "id") < getattr(that, "id"):
-                    return -1
-                if getattr(this, "id") > getattr(that, "id"):
-                    return 1
-                if getattr(this, "id") == getattr(that, "id"):
-                    return 0
-
-        # adapted from
-        # https://realpython.com/sorting-algorithms-python/#the-quicksort-algorithm-in-python
-        def quicksort(posts_to_sort):
-            if len(posts_to_sort) < 2:
-                return posts_to_sort
-
-            low, same, high = [], [], []
-
-            pivot = posts_to_sort[randint(0, len(posts_to_sort) - 1)]
-
-            for item in posts_to_sort:
-                if compare(item, pivot, criteria) < 0:
-                    low.append(item)
-                if compare(item, pivot, criteria) == 0:
-                    same.append(item)
-                if compare(item, pivot, criteria) > 0:
-                    high.append(item)
-
-            return quicksort(low) + same + quicksort(high)
-
-        return quicksort(posts_to_sort)
+    # optional pagination. limit defaults to MAX_PAGE_LIMIT once a cursor is passed.
+    limit = args.get("limit")
+    cursor = args.get("cursor")
+    paginate = bool(limit) or bool(cursor)
+    if limit:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > MAX_PAGE_LIMIT:
+            return (
+                jsonify(
+                    {
+                        "error": f"Invalid limit passed. Must be an integer between 1 and {MAX_PAGE_LIMIT}"
+                    }
+                ),
+                400,
+            )
+    else:
+        limit = MAX_PAGE_LIMIT
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sortBy, direction)
+        except ValueError:
+            return (
+                jsonify(
+                    {
+                        "error": "Invalid cursor passed. Cursors are only valid with the sortBy and direction they were returned for."
+                    }
+                ),
+                400,
+            )
+
+    # optional tag filter, resolved with the tag name and post_tag indexes.
+    tags = args.get("tags")
+    tags = [tag for tag in tags.split(",") if tag] if tags else None
+    tagMode = args.get("tagMode")
+    if not tagMode:
+        tagMode = "any"
+    if tagMode not in VALID_TAG_MODES:
+        return (
+            jsonify(
+                {"error": f"Invalid tagMode passed. Must be one of {VALID_TAG_MODES}"}
+            ),
+            400,
+        )
+
+    try:
+        fields = parse_fields(args.get("fields"))
+    except ValueError:
+        return invalid_fields_response()
+    try:
+        include = parse_include(args.get("include"))
+    except ValueError:
+        return invalid_include_response()
+
+    query_key = response_cache.posts_key(
+        authorIds,
+        sortBy,
+        direction,
+        limit if paginate else None,
+        cursor,
+        tags,
+        tagMode,
+        fields,
+        include,
+    )
+
+    # conditional GET. The ETag needs only the authors' posts versions, one primary key read,
+    # so an unchanged feed is answered without loading or serializing any post.
+    etag = posts_etag(query_key, User.posts_versions(authorIds))
+    # compressed responses carry the weak form of the ETag, see compression.apply.
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    # serve repeated queries from the response cache. Writes to any requested author's posts drop the entry.
+    # a write commits its version bump before it drops the entry, so an entry built under another ETag
+    # is stale and treated as a miss.
+    # compressed bodies are cached along with the response, each coding is compressed once per entry.
+    use_cache = current_app.config["POSTS_CACHE_ENABLED"]
+    if use_cache:
+        generation = response_cache.generation()
+        cached = response_cache.posts_cache.get(query_key)
+        if cached is not None and cached[2] == etag:
+            body, status, _, variants = cached
+            response = Response(body, status, mimetype="application/json")
+            response.set_etag(etag)
+            encoding = compression.negotiate(len(body))
+            if encoding is not None:
+                data = variants.get(encoding)
+                if data is None:
+                    data = compression.compress(body, encoding)
+                    response_cache.store(
+                        query_key,
+                        authorIds,
+                        body,
+                        status,
+                        etag,
+                        generation,
+                        {**variants, encoding: data},
+                    )
+                compression.apply(response, encoding, data)
+            return response
+
+    # with the fragment cache the page query reads only ids, versions and sort keys, see render_posts.
+    # pretty printed responses are left to jsonify.
+    use_fragments = current_app.config["POST_FRAGMENT_CACHE_ENABLED"] and not (
+        current_app.config["JSONIFY_PRETTYPRINT_REGULAR"] or current_app.debug
+    )
+
+    # get matching posts, de-duplicated and sorted by the database.
+    # one extra row is fetched to find out whether another page follows.
+    matched_posts = Post.get_posts_by_user_ids(
+        authorIds,
+        sortBy,
+        direction,
+        after=after,
+        limit=limit + 1 if paginate else None,
+        tags=tags,
+        tag_mode=tagMode,
+        fields=[] if use_fragments else fields,
+        authors=bool(include) and not use_fragments,
+    )
+
+    next_cursor = None
+    if paginate and len(matched_posts) > limit:
+        matched_posts = matched_posts[:limit]
+        next_cursor = encode_cursor(matched_posts[-1], sortBy, direction)
+
+    if len(matched_posts) == 0 and after is None:
+        response = jsonify(
+            {"no results": "There were no posts matching the criteria submitted."}
+        )
+    elif use_fragments:
+        members = {"posts": render_posts(matched_posts, fields, include)}
+        if paginate:
+            members["nextCursor"] = flask_json.dumps(next_cursor)
+        response = Response(
+            encode_object(members),
+            mimetype=current_app.config["JSONIFY_MIMETYPE"],
+        )
+    else:
+        payload = {"posts": serialize_posts(matched_posts, fields, include)}
+        if paginate:
+            payload["nextCursor"] = next_cursor
+        response = jsonify(payload)
+    response.set_etag(etag)
+    if use_cache:
+        body = response.get_data()
+        variants = {}
+        encoding = compression.negotiate(len(body))
+        if encoding is not None:
+            variants[encoding] = compression.compress(body, encoding)
+            compression.apply(response, encoding, variants[encoding])
+        response_cache.store(
+            query_key, authorIds, body, 200, etag, generation, variants
+        )
+    return response, 200
+
+
+@api.get("/posts/search")
+@auth_required
+def search_posts():
+    """
+    Accepts a GET request. Returns the posts whose text contains every word of the search terms,
+    looked up in the post_fts full-text index, as a JSON payload with HTTPResponseCode.
+
+    :param q: (str) search terms separated by spaces e.g. "beach hotel".
+    :param authorIds: (str) optional comma separated list of integers e.g. "1,5". Only posts of these authors are returned.
+    :param sortBy: (str) "rank" or one of VALID_SORTS. Default is "rank", the best match first when ascending.
+    :param direction: (str) Sorting direction of results. Options are "asc" and "desc". Default is "asc".
+    :param limit: (int) optional number of posts to return, at most MAX_PAGE_LIMIT. Default is MAX_PAGE_LIMIT.
+    :param fields: (str) optional comma separated list of post fields to return, as for GET /api/posts.
+    :param include: (str) optional comma separated list of VALID_INCLUDES, as for GET /api/posts.
+    :returns: JSON object in the format {"posts":[...]} with the same post fields as GET /api/posts, HTTPResponseCode
+    :returns: JSON object in the format {"error":"<error message"}
+    """
+    user = g.get("user")
+    if user is None:
+        return abort(401)
+
+    args = request.args
+
+    q = args.get("q", "")
+    if not q.strip():
+        return jsonify({"error": "Must provide search terms in q."}), 400
+
+    authorIds = args.get("authorIds")
+    if authorIds:
+        try:
+            authorIds = [int(x) for x in authorIds.split(",")]
+        except ValueError:
+            return (
+                jsonify(
+                    {
+                        "error": "All ids passed must be a positive integer. Integers must be separated by a comma. [,]"
+                    }
+                ),
+                400,
+            )
+    else:
+        authorIds = None
+
+    sortBy = args.get("sortBy") or "rank"
+    if sortBy != "rank" and sortBy not in VALID_SORTS:
+        return (
+            jsonify(
+                {
+                    "error": f"Invalid sortBy passed. Must be one of {['rank'] + VALID_SORTS}"
+                }
+            ),
+            400,
+        )
+
+    direction = args.get("direction") or "asc"
+    if direction not in ["asc", "desc"]:
+        return (
+            jsonify(
+                {"error": 'Invalid sort order specified. Must be one of ["asc","desc"]'}
+            ),
+            400,
+        )
+
+    limit = args.get("limit")
+    if limit:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > MAX_PAGE_LIMIT:
+            return (
+                jsonify(
+                    {
+                        "error": f"Invalid limit passed. Must be an integer between 1 and {MAX_PAGE_LIMIT}"
+                    }
+                ),
+                400,
+            )
+    else:
+        limit = MAX_PAGE_LIMIT
 
+    try:
+        fields = parse_fields(args.get("fields"))
+    except ValueError:
+        return invalid_fields_response()
+    try:
+        include = parse_include(args.get("include"))
+    except ValueError:
+        return invalid_include_response()
+
+    matched_posts = Post.search(
+        q, authorIds, sortBy, direction, limit, fields, authors=bool(include)
+    )
     if len(matched_posts) == 0:
         return (
             jsonify(
@@ -179,12 +657,7 @@ def get_posts():
             200,
         )
 
-    sorted_posts = sort_posts_by_criteria(matched_posts, sortBy)
-
-    if direction == "desc":
-        sorted_posts.reverse()
-
-    return jsonify({"posts": [i.serialize() for i in sorted_posts]}), 200
+    return jsonify({"posts": serialize_posts(matched_posts, fields, include)}), 200
 
 
 @api.patch("/posts/<post_id>")
@@ -198,9 +671,11 @@ def update_posts(post_id):
     All fields are optional, any not passed will not be changed.
 
     :param post_id: (int) the numerical id of the post.
-    :param authorIds: list(int) a list of numerical author ids.
-    :param tags: list(str) a list of tags to apply to the post.
-    :param text: (str) the body of the post.
+    :param authorIds: list(int) a list of numerical author ids. Requires a role with MANAGE_AUTHORS.
+    :param authorRoles: dict(str, str) optional role name per author id, e.g. {"5": "editor"}. Only valid with authorIds.
+        New authors without an entry get DEFAULT_AUTHOR_ROLE, existing authors keep their role.
+    :param tags: list(str) a list of tags to apply to the post. Requires a role with UPDATE.
+    :param text: (str) the body of the post. Requires a role with UPDATE.
     :returns: a JSON object of the updated post.
     :returns: a JSON object containing an error code.
     """
@@ -214,20 +689,19 @@ def update_posts(post_id):
     if post is None:
         return jsonify({"error": f"Post with id {post_id} could not be found."}), 404
 
-    # confirm requestor of edit is an author on the post.
-    if not user.isAuthor(post):
+    # confirm requestor of edit is an author on the post. The membership row carries their role.
+    membership = UserPost.membership(user.id, post.id)
+    if membership is None:
         return (
             jsonify({"error": "Users may only edit their own posts using this API."}),
             401,
         )
 
-    print("request:", request, request.json)
-    print("unmodified post\n", post)
     data = request.json
 
     # Below: Extract variables from json data. Ignore variables with blank values.
 
-    author_ids = tags = text = None
+    author_ids = author_roles = tags = text = None
     # authorIds
     if "authorIds" in data.keys():
         author_ids = data["authorIds"]
@@ -239,7 +713,8 @@ def update_posts(post_id):
         if len(author_ids) == 0:
             return jsonify({"error": "Cannot set author_ids to a blank list."}), 400
         for author_id in author_ids:
-            if not isinstance(author_id, int):
+            # bool is a subclass of int, true and false are not ids.
+            if isinstance(author_id, bool) or not isinstance(author_id, int):
                 return (
                     jsonify(
                         {
@@ -248,15 +723,67 @@ def update_posts(post_id):
                     ),
                     400,
                 )
-            if User.query.get(author_id) is None:
+        # validate every id with one query, reporting all of the missing ones at once.
+        missing_ids = User.missing_user_ids(author_ids)
+        if len(missing_ids) == 1:
+            return (
+                jsonify(
+                    {
+                        "error": f"The used referenced by id ({missing_ids[0]}) does not exist. Cannot add as author."
+                    }
+                ),
+                400,
+            )
+        if len(missing_ids) > 1:
+            return (
+                jsonify(
+                    {
+                        "error": f"The users referenced by ids ({', '.join(str(i) for i in missing_ids)}) do not exist. Cannot add as authors."
+                    }
+                ),
+                400,
+            )
+
+    # authorRoles
+    if "authorRoles" in data.keys():
+        if author_ids is None:
+            return (
+                jsonify(
+                    {"error": "authorRoles must be passed together with authorIds."}
+                ),
+                400,
+            )
+        if not isinstance(data["authorRoles"], dict):
+            return (
+                jsonify(
+                    {
+                        "error": "Must pass an object of author id to role name for authorRoles."
+                    }
+                ),
+                400,
+            )
+        author_roles = {}
+        for author_id, role_name in data["authorRoles"].items():
+            try:
+                author_id = int(author_id)
+            except ValueError:
+                author_id = None
+            if author_id not in author_ids:
                 return (
                     jsonify(
                         {
-                            "error": f"The used referenced by id ({author_id}) does not exist. Cannot add as author."
+                            "error": f"authorRoles may only name ids listed in authorIds. Got {data['authorRoles']}"
                         }
                     ),
                     400,
                 )
+            role_id = Role.id_for(role_name) if isinstance(role_name, str) else None
+            if role_id is None:
+                return (
+                    jsonify({"error": f'The role "{role_name}" does not exist.'}),
+                    400,
+                )
+            author_roles[author_id] = role_id
 
     # tags
     if "tags" in data.keys():
@@ -302,26 +829,32 @@ def update_posts(post_id):
         if len(text) == 0:
             return jsonify({"error": "Cannot set text to a zero-length string."})
 
-    # actually do the changes needed now that all data is verified.
+    # confirm the requestor's role grants every kind of change requested.
+    # the bitmask comes from the cached role definitions, so this adds no query.
+    required = 0
     if author_ids is not None:
-        UserPost.query.filter_by(post_id=post_id).delete()
-        for a_id in author_ids:
-            user = User.query.get(a_id)
-            db.session.add(UserPost(user_id=a_id, post_id=post_id))
-        print("post within author_ids conditional:\n", post)
-
-    if tags is not None:
-        post.tags = tags
+        required |= Permission.MANAGE_AUTHORS
+    if tags is not None or text is not None:
+        required |= Permission.UPDATE
+    if required & ~membership.permissions:
+        return (
+            jsonify({"error": "Your role on this post does not permit this change."}),
+            403,
+        )
 
-    if text is not None:
-        post.text = text
+    # actually do the changes needed now that all data is verified, in one transaction.
+    # cached pages of both the previous and the new authors are dropped.
+    previous_author_ids = UserPost.author_ids(post.id)
+    try:
+        writes.submit(Post.apply_update, post.id, author_ids, author_roles, tags, text)
+    except OwnerRequired as e:
+        return jsonify({"error": str(e)}), 400
+    response_cache.invalidate_authors(previous_author_ids | set(author_ids or ()))
+    response_cache.invalidate_post_fragments([post.id])
 
-    print("post after all conditionals:\n", post)
-    db.session.commit()
-    db.session.refresh(post)
-    post = Post.get_post_by_post_id(post_id)
-    print("post after commit:\n", post)
+    # the write may have been committed by another session, reload what this one has cached.
+    db.session.expire_all()
+    post = Post.get_post_by_post_id(post_id, authors=True)
 
-    print("Returned post:", post.serialize(withUsers=True))
     # return post by ID from database.
     return jsonify({"post": post.serialize(withUsers=True)}), 200
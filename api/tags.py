@@ -0,0 +1,81 @@
+from flask import current_app, jsonify, request, g, abort
+
+from api import api
+import response_cache
+from db.models.tag_count import TagCount
+from middlewares import auth_required
+
+MAX_FACETS_LIMIT = 1000
+
+
+@api.get("/tags")
+@auth_required
+def get_tag_facets():
+    """
+    Accepts a GET request. Returns the number of posts carrying each tag, highest count first.
+    Counts are read from counters kept current by the post write paths, not computed from the posts,
+    except for several authors: their counts are computed from the posts and cached until a write
+    changes the posts, tags or authors of any of them, see TagCount.facets.
+
+    :param authorIds: (str) optional comma separated list of integers e.g. "1,5". Restricts the counts to
+        posts of these authors. A post written by several of them is counted once.
+    :param limit: (int) optional number of tags to return, at most MAX_FACETS_LIMIT.
+    :returns: JSON object in the format {"tags":[{"tag":(str),"count":(int)},[...]]}, HTTPResponseCode
+    :returns: JSON object in the format {"error":"<error message"}
+    """
+    if g.get("user") is None:
+        return abort(401)
+
+    args = request.args
+
+    authorIds = args.get("authorIds")
+    if authorIds:
+        try:
+            authorIds = [int(x) for x in authorIds.split(",")]
+        except ValueError:
+            return (
+                jsonify(
+                    {
+                        "error": "All ids passed must be a positive integer. Integers must be separated by a comma. [,]"
+                    }
+                ),
+                400,
+            )
+    else:
+        authorIds = None
+
+    limit = args.get("limit")
+    if limit:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1 or limit > MAX_FACETS_LIMIT:
+            return (
+                jsonify(
+                    {
+                        "error": f"Invalid limit passed. Must be an integer between 1 and {MAX_FACETS_LIMIT}"
+                    }
+                ),
+                400,
+            )
+    else:
+        limit = None
+
+    if (
+        authorIds is not None
+        and len(set(authorIds)) > 1
+        and current_app.config["TAG_FACETS_CACHE_ENABLED"]
+    ):
+        key = response_cache.facets_key(authorIds, limit)
+        generation = response_cache.generation()
+        facets = response_cache.tag_facets_cache.get(key)
+        if facets is None:
+            facets = TagCount.facets(authorIds, limit)
+            response_cache.store_facets(key, facets, generation)
+    else:
+        facets = TagCount.facets(authorIds, limit)
+    return (
+        jsonify({"tags": [{"tag": tag, "count": count} for tag, count in facets]}),
+        200,
+    )
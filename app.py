@@ -11,18 +11,156 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def env_flag(name, default):
+    """reads a true/false switch from the environment"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def serving_requests():
+    """whether the app is loaded to serve requests rather than for a flask command such as upgrade-db"""
+    ctx = click.get_current_context(silent=True)
+    return ctx is None or ctx.info_name == "run"
+
+
 def create_app():
     sys.path.append(".")  # to allow sub modules to access the parent module easily
 
     from db.shared import db
+    from db.passwords import hasher
+    from db.writes import writes
+    from db.counters import counters
+    from db.popularity import popularity
+    from db import pragmas
     from api import api as api_blueprint
+    import compression
+    import json_encoding
+    import middlewares
+    import response_cache
 
     app = Flask(__name__)
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
         "DB_PATH", "sqlite:///database.db"
     )
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SESSION_SECRET"] = os.environ.get("SESSION_SECRET")
+
+    # cache of verified tokens and their users, see middlewares.auth_required
+    app.config["AUTH_CACHE_ENABLED"] = env_flag("AUTH_CACHE_ENABLED", True)
+    app.config["AUTH_CACHE_SIZE"] = int(os.environ.get("AUTH_CACHE_SIZE", 10000))
+    app.config["AUTH_CACHE_TTL"] = float(os.environ.get("AUTH_CACHE_TTL", 300))
+
+    # bcrypt work is done in a process pool, see db.passwords
+    app.config["BCRYPT_ROUNDS"] = int(os.environ.get("BCRYPT_ROUNDS", 12))
+    app.config["HASH_POOL_ENABLED"] = env_flag("HASH_POOL_ENABLED", True)
+    app.config["HASH_POOL_SIZE"] = int(
+        os.environ.get("HASH_POOL_SIZE", os.cpu_count() or 1)
+    )
+    app.config["HASH_POOL_MAX_QUEUE"] = int(
+        os.environ.get("HASH_POOL_MAX_QUEUE", 4 * app.config["HASH_POOL_SIZE"])
+    )
+
+    # caches of GET /api/posts responses and of each post's encoded JSON, see response_cache
+    app.config["POSTS_CACHE_ENABLED"] = env_flag("POSTS_CACHE_ENABLED", True)
+    app.config["POSTS_CACHE_SIZE"] = int(os.environ.get("POSTS_CACHE_SIZE", 1024))
+    app.config["POSTS_CACHE_MAX_BYTES"] = int(
+        os.environ.get("POSTS_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    app.config["POSTS_CACHE_TTL"] = float(os.environ.get("POSTS_CACHE_TTL", 300))
+    app.config["POST_FRAGMENT_CACHE_ENABLED"] = env_flag(
+        "POST_FRAGMENT_CACHE_ENABLED", True
+    )
+    app.config["POST_FRAGMENT_CACHE_SIZE"] = int(
+        os.environ.get("POST_FRAGMENT_CACHE_SIZE", 100000)
+    )
+    app.config["POST_FRAGMENT_CACHE_MAX_BYTES"] = int(
+        os.environ.get("POST_FRAGMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    app.config["TAG_FACETS_CACHE_ENABLED"] = env_flag("TAG_FACETS_CACHE_ENABLED", True)
+    app.config["TAG_FACETS_CACHE_SIZE"] = int(
+        os.environ.get("TAG_FACETS_CACHE_SIZE", 1024)
+    )
+
+    # encoder of every JSON response: "auto" (orjson when installed), "orjson" or "stdlib", see json_encoding
+    app.config["JSON_ENCODER"] = os.environ.get("JSON_ENCODER", "auto")
+
+    # compression of JSON and text responses negotiated with Accept-Encoding, see compression.
+    # gzip is always offered, br and zstd when brotli or zstandard are installed.
+    app.config["COMPRESSION_ENABLED"] = env_flag("COMPRESSION_ENABLED", True)
+    app.config["COMPRESSION_MIN_SIZE"] = int(
+        os.environ.get("COMPRESSION_MIN_SIZE", 1024)
+    )
+    app.config["COMPRESSION_GZIP_LEVEL"] = int(
+        os.environ.get("COMPRESSION_GZIP_LEVEL", 6)
+    )
+    app.config["COMPRESSION_BROTLI_QUALITY"] = int(
+        os.environ.get("COMPRESSION_BROTLI_QUALITY", 5)
+    )
+    app.config["COMPRESSION_ZSTD_LEVEL"] = int(
+        os.environ.get("COMPRESSION_ZSTD_LEVEL", 3)
+    )
+
+    # largest array POST /api/posts/bulk accepts
+    app.config["BULK_MAX_POSTS"] = int(os.environ.get("BULK_MAX_POSTS", 50000))
+
+    # SQLite tuning applied to every connection, see db.pragmas
+    pragmas.load_config(app)
+
+    # optional group commit of endpoint writes, see db.writes
+    app.config["WRITE_QUEUE_ENABLED"] = env_flag("WRITE_QUEUE_ENABLED", False)
+    app.config["WRITE_QUEUE_MAX_BATCH"] = int(
+        os.environ.get("WRITE_QUEUE_MAX_BATCH", 64)
+    )
+    app.config["WRITE_QUEUE_MAX_WAIT_MS"] = float(
+        os.environ.get("WRITE_QUEUE_MAX_WAIT_MS", 2)
+    )
+    app.config["WRITE_QUEUE_TIMEOUT_MS"] = float(
+        os.environ.get("WRITE_QUEUE_TIMEOUT_MS", 30000)
+    )
+
+    # write-behind like and read counters, see db.counters
+    app.config["COUNTER_BUFFER_ENABLED"] = env_flag("COUNTER_BUFFER_ENABLED", True)
+    app.config["COUNTER_FLUSH_INTERVAL"] = float(
+        os.environ.get("COUNTER_FLUSH_INTERVAL", 1.0)
+    )
+    app.config["COUNTER_MAX_DELTA"] = int(os.environ.get("COUNTER_MAX_DELTA", 10000))
+
+    # popularity recomputation from likes and reads, see db.popularity. 0 disables the periodic job.
+    app.config["POPULARITY_LIKES_WEIGHT"] = float(
+        os.environ.get("POPULARITY_LIKES_WEIGHT", 0.7)
+    )
+    app.config["POPULARITY_READS_WEIGHT"] = float(
+        os.environ.get("POPULARITY_READS_WEIGHT", 0.3)
+    )
+    app.config["POPULARITY_CHUNK_SIZE"] = int(
+        os.environ.get("POPULARITY_CHUNK_SIZE", 100000)
+    )
+    app.config["POPULARITY_INTERVAL"] = float(os.environ.get("POPULARITY_INTERVAL", 0))
+
+    # refuse to serve a database older than the models instead of failing every request on it.
+    app.config["SCHEMA_CHECK_ENABLED"] = env_flag("SCHEMA_CHECK_ENABLED", True)
+
     db.init_app(app)
+    pragmas.init_app(app, db)
+    if app.config["SCHEMA_CHECK_ENABLED"] and serving_requests():
+        from db.migrations import SchemaOutdated, missing_schema
+
+        with app.app_context():
+            missing = missing_schema(db)
+        if missing:
+            raise SchemaOutdated(
+                f"the database is missing {', '.join(missing)}, run flask upgrade-db"
+            )
+    json_encoding.init_app(app)
+    middlewares.init_app(app)
+    response_cache.init_app(app)
+    compression.init_app(app)
+    hasher.init_app(app)
+    writes.init_app(app)
+    counters.init_app(app)
+    popularity.init_app(app)
 
     app.register_blueprint(api_blueprint, url_prefix="/api")
 
@@ -39,6 +177,60 @@ def create_app():
         # now you're handling non-HTTP exceptions only
         return {"message": repr(e), "stack": traceback.format_exc()}, 500
 
+    @app.cli.command("upgrade-db")
+    def upgrade_db():
+        """Create missing tables and indexes in an existing database."""
+
+        from db.migrations import upgrade
+
+        applied = upgrade(db)
+        for change in applied:
+            click.echo(f"created {change}")
+        click.echo("database is up to date" if not applied else "upgrade complete")
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans():
+        """Verify with EXPLAIN QUERY PLAN that the hot queries use indexes."""
+
+        from db.migrations import check_query_plans
+
+        failed = False
+        for description, plan, problems in check_query_plans(db):
+            click.echo(f"{'; '.join(problems) if problems else 'ok'}: {description}")
+            for step in plan:
+                click.echo(f"    {step}")
+            failed = failed or bool(problems)
+        sys.exit(1 if failed else 0)
+
+    @app.cli.command("rebuild-tag-counts")
+    def rebuild_tag_counts():
+        """Recompute the tag facet counters from the posts."""
+
+        from db.models.tag_count import TagCount
+
+        corrected = TagCount.rebuild()
+        db.session.commit()
+        click.echo(f"tag counts rebuilt, {corrected} counters corrected")
+
+    @app.cli.command("build-search-index")
+    def build_search_index():
+        """Create the post_fts search index if needed and index every post."""
+
+        from db.search import rebuild_search_index
+
+        with db.engine.begin() as connection:
+            rebuild_search_index(connection)
+        click.echo("search index rebuilt")
+
+    @app.cli.command("recompute-popularity")
+    def recompute_popularity():
+        """Recompute the popularity of every post from its likes and reads."""
+
+        result = popularity.recompute()
+        click.echo(
+            f"scored {result['posts']} posts, updated {result['updated']} in {result['seconds']:.2f}s"
+        )
+
     @app.cli.command()
     @click.argument("test_names", nargs=-1)
     def test(test_names):
@@ -0,0 +1,72 @@
+"""
+Benchmark of the jsonify encoders on GET /api/posts sized payloads: Flask's stdlib JSONEncoder against
+json_encoding.OrjsonEncoder, with the options jsonify uses outside of debug mode.
+
+Run from the repository root, e.g. python bench/json_encoding.py > bench_output.txt
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json import JSONEncoder
+
+from json_encoding import OrjsonEncoder, orjson
+
+POSTS = 1000
+REPEAT = 20
+TEXT = (
+    "Excepteur occaecat minim reprehenderit cupidatat dolore voluptate velit labore pariatur culpa "
+    "esse mollit. Veniam ipsum amet eu dolor reprehenderit quis tempor pariatur labore. Tempor "
+    "excepteur velit dolor commodo aute. Proident aute cillum dolor sint laborum tempor cillum "
+    "voluptate minim. Amet qui eiusmod duis est labore cupidatat excepteur occaecat nulla."
+)
+TAGS = ["food", "recipes", "baking", "travel", "hotels", "airbnb", "vacation", "spa"]
+# what jsonify passes to the encoder with the default JSON_SORT_KEYS and JSON_AS_ASCII.
+OPTIONS = {"separators": (",", ":"), "sort_keys": True, "ensure_ascii": True}
+
+
+def make_page(count, text):
+    posts = []
+    for i in range(1, count + 1):
+        post = {
+            "id": i,
+            "likes": i % 500,
+            "reads": i % 5000,
+            "popularity": (i % 100) / 100,
+            "tags": TAGS[i % 4 : i % 4 + 3],
+            "authorIds": [i % 5 + 1, (i + 1) % 5 + 1],
+        }
+        if text:
+            post["text"] = f"{TEXT} Post {i}."
+        posts.append(post)
+    return {"posts": posts}
+
+
+def best_ms(encoder, page):
+    return (
+        min(timeit.repeat(lambda: encoder.encode(page), number=1, repeat=REPEAT)) * 1e3
+    )
+
+
+def main():
+    if orjson is None:
+        sys.exit("orjson is not installed, install the fast-json extra")
+
+    stdlib = JSONEncoder(**OPTIONS)
+    fast = OrjsonEncoder(**OPTIONS)
+    print(f"{POSTS} posts per page, best of {REPEAT}")
+    for label, text in (("with text", True), ("without text", False)):
+        page = make_page(POSTS, text)
+        assert fast.encode(page) == stdlib.encode(page)
+        slow_ms = best_ms(stdlib, page)
+        fast_ms = best_ms(fast, page)
+        print(
+            f"{label:<13} stdlib {slow_ms:6.2f} ms  orjson {fast_ms:6.2f} ms  "
+            f"speedup {slow_ms / fast_ms:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Microbenchmark of model serialization: the row_to_dict loop db.utils used before db.serializers,
+against the cached Serializer that replaced it.
+
+Run from the repository root, e.g. python bench/serializers.py > bench_output.txt
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.models.post import Post
+from db.models.user import User  # noqa: F401, configures Post's relationships
+from db.models.user_post import UserPost  # noqa: F401
+from db.serializers import serializer_for
+from db.utils import to_camel_case
+
+ROWS = 10000
+REPEAT = 5
+
+
+def legacy_row_to_dict(row):
+    # db.utils.row_to_dict before db.serializers: the keys are recomputed and every column read on every row.
+    result = {}
+    for column in row.__table__.columns:
+        result[to_camel_case(column.name)] = getattr(row, column.name)
+    return result
+
+
+def legacy_rows_to_list(rows):
+    results = []
+    for row in rows:
+        results.append(legacy_row_to_dict(row))
+    return results
+
+
+def make_posts(count):
+    return [
+        Post(
+            id=i,
+            text=f"post {i} about a three-day trip, with notes on food and hotels",
+            likes=i % 500,
+            reads=i % 5000,
+            popularity=(i % 100) / 100,
+            version=i % 7,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def best_per_row(function, rows):
+    return min(timeit.repeat(lambda: function(rows), number=1, repeat=REPEAT)) / len(
+        rows
+    )
+
+
+def main():
+    posts = make_posts(ROWS)
+    serializer = serializer_for(
+        Post, [column.name for column in Post.__table__.columns]
+    )
+    assert serializer.serialize_many(posts) == legacy_rows_to_list(posts)
+
+    legacy = best_per_row(legacy_rows_to_list, posts)
+    cached = best_per_row(serializer.serialize_many, posts)
+    print(f"{ROWS} posts, {len(serializer.fields)} columns, best of {REPEAT}")
+    print(f"legacy rows_to_list       {legacy * 1e6:6.2f} us/row")
+    print(f"Serializer.serialize_many {cached * 1e6:6.2f} us/row")
+    print(f"speedup                   {legacy / cached:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
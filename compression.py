@@ -0,0 +1,106 @@
+import gzip
+
+from flask import current_app, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional, br is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional, zstd is not offered without it
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/")
+
+_stats = {"compressed": 0, "bytesIn": 0, "bytesOut": 0}
+metrics.register("compression", lambda: {**_stats, "encodings": available()})
+
+
+def init_app(app):
+    """compresses every eligible response of the app, see compress_response"""
+    app.after_request(compress_response)
+
+
+def available():
+    """returns the content codings this process can produce, most preferred first"""
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(body_size):
+    """
+    Returns the content coding to compress a body of body_size bytes with for the current request,
+    picked by the client's Accept-Encoding qualities with available() breaking ties, or None to send it
+    as is: compression disabled, body under COMPRESSION_MIN_SIZE or no acceptable coding.
+    """
+    config = current_app.config
+    if not config["COMPRESSION_ENABLED"] or body_size < config["COMPRESSION_MIN_SIZE"]:
+        return None
+    return request.accept_encodings.best_match(available())
+
+
+def compress(body, encoding):
+    """compresses body with the content coding at its configured level. Output is deterministic."""
+    config = current_app.config
+    if encoding == "br":
+        data = brotli.compress(body, quality=config["COMPRESSION_BROTLI_QUALITY"])
+    elif encoding == "zstd":
+        data = zstandard.ZstdCompressor(
+            level=config["COMPRESSION_ZSTD_LEVEL"]
+        ).compress(body)
+    else:
+        # mtime=0 keeps the gzip header, and so the output, the same for the same body.
+        data = gzip.compress(
+            body, compresslevel=config["COMPRESSION_GZIP_LEVEL"], mtime=0
+        )
+    _stats["compressed"] += 1
+    _stats["bytesIn"] += len(body)
+    _stats["bytesOut"] += len(data)
+    return data
+
+
+def apply(response, encoding, data):
+    """
+    Sends data, body compressed with encoding, as the response. A strong ETag becomes weak: it
+    identifies the uncompressed representation, which If-None-Match compares weakly.
+    """
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """
+    after_request hook compressing JSON and text bodies of at least COMPRESSION_MIN_SIZE bytes with the
+    coding negotiated from Accept-Encoding. Responses that are already encoded, streamed or without
+    a body are passed through.
+    """
+    if (
+        not current_app.config["COMPRESSION_ENABLED"]
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_MIMETYPES)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = negotiate(len(body))
+    if encoding is not None:
+        apply(response, encoding, compress(body, encoding))
+    return response
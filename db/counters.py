@@ -0,0 +1,171 @@
+import atexit
+import logging
+import threading
+import time
+
+import metrics
+import response_cache
+from db.writes import writes
+
+COUNTER_FIELDS = ("likes", "reads")
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Write-behind aggregation of post like and read increments.
+
+    Increments are summed in memory per post and written by a background thread every flush_interval
+    seconds as one executemany of `UPDATE post SET likes = likes + ?, reads = reads + ?`, so a burst of
+    hits on a post costs one row update instead of one transaction each. Once max_delta increments are
+    buffered the thread is woken to flush immediately, which bounds both memory and the counts lost if the
+    process is killed. Request threads never flush themselves: flush pushes its own app context, whose
+    teardown would remove the request's scoped session. Buffered counts are also flushed at interpreter exit.
+    When the buffer is disabled every increment is written and committed immediately.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.flush_interval = 1.0
+        self.max_delta = 10000
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.flush_time = metrics.Timing()
+        self._app = None
+        self._pending = {}  # post id -> {field: delta}
+        self._pending_delta = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = None  # Event that stops the current flush thread
+        self._wake = None  # Event that makes the current flush thread flush before its interval is up
+        self._atexit_registered = False
+
+    def init_app(self, app):
+        """
+        Applies the COUNTER_* settings from app config and starts from an empty buffer.
+        A running flush thread is stopped, the next increment starts one with the new settings.
+        """
+        self.enabled = app.config["COUNTER_BUFFER_ENABLED"]
+        self.flush_interval = app.config["COUNTER_FLUSH_INTERVAL"]
+        self.max_delta = app.config["COUNTER_MAX_DELTA"]
+        self._app = app
+        with self._lock:
+            self._pending = {}
+            self._pending_delta = 0
+            self._stop_thread()
+        if not self._atexit_registered:
+            atexit.register(self.shutdown)
+            self._atexit_registered = True
+
+    def increment(self, post_id, field, amount=1):
+        """Adds amount to a counter column of a post. Buffered unless the buffer is disabled."""
+        if field not in COUNTER_FIELDS:
+            raise ValueError(f"{field} is not one of {COUNTER_FIELDS}")
+
+        if not self.enabled:
+            from db.models.post import Post
+
+            writes.submit(Post.add_counts, {post_id: {field: amount}})
+            response_cache.invalidate_posts([post_id])
+            return
+
+        with self._lock:
+            deltas = self._pending.setdefault(post_id, {})
+            deltas[field] = deltas.get(field, 0) + amount
+            self._pending_delta += amount
+            full = self._pending_delta >= self.max_delta
+        self._start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Writes every buffered increment in one transaction. On failure the increments are put back
+        into the buffer for the next flush.
+        :returns: the number of posts updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_delta = 0
+        if not pending:
+            return 0
+
+        from db.models.post import Post
+
+        started = time.perf_counter()
+        try:
+            with self._app.app_context():
+                writes.submit(Post.add_counts, pending)
+                response_cache.invalidate_posts(pending)
+        except Exception:
+            logger.exception("flushing %d buffered post counters failed", len(pending))
+            self.failed_flushes += 1
+            self._restore(pending)
+            return 0
+
+        self.flush_time.observe(time.perf_counter() - started)
+        self.flushes += 1
+        self.flushed_rows += len(pending)
+        return len(pending)
+
+    def shutdown(self):
+        """stops the flush thread and writes whatever is still buffered"""
+        with self._lock:
+            self._stop_thread()
+        if self._app is not None:
+            self.flush()
+
+    def stats(self):
+        """returns the buffer counters in an easily serialized (jsonify-able) format"""
+        return {
+            "enabled": self.enabled,
+            "flushIntervalS": self.flush_interval,
+            "maxDelta": self.max_delta,
+            "pendingPosts": len(self._pending),
+            "pendingDelta": self._pending_delta,
+            "flushes": self.flushes,
+            "flushedRows": self.flushed_rows,
+            "failedFlushes": self.failed_flushes,
+            "flushTime": self.flush_time.stats(),
+        }
+
+    def _restore(self, pending):
+        with self._lock:
+            for post_id, deltas in pending.items():
+                buffered = self._pending.setdefault(post_id, {})
+                for field, amount in deltas.items():
+                    buffered[field] = buffered.get(field, 0) + amount
+                    self._pending_delta += amount
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop = threading.Event()
+                self._wake = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._stop, self._wake, self.flush_interval),
+                    name="counter-flush",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def _stop_thread(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread = None
+
+    def _run(self, stop, wake, interval):
+        while True:
+            wake.wait(interval)
+            wake.clear()
+            if stop.is_set():
+                return
+            self.flush()
+
+
+counters = CounterBuffer()
+metrics.register("counterBuffer", counters.stats)
@@ -0,0 +1,307 @@
+import re
+
+from sqlalchemy import MetaData, delete, inspect, select, text
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from db.models.post import Post
+from db.search import create_search_index, rebuild_search_index
+from db.models.role import DEFAULT_ROLES, Role
+from db.models.tag import PostTag, Tag
+from db.models.tag_count import TagCount
+from db.models.user import User
+from db.models.user_post import UserPost
+
+# posts read per round trip when moving the legacy post.tags column into post_tag.
+TAGS_MIGRATION_CHUNK_SIZE = 1000
+
+
+class SchemaOutdated(Exception):
+    """Raised at startup when the database lacks tables or columns the models need, see missing_schema."""
+
+
+def upgrade(db):
+    """
+    Brings an existing database up to date with the models without reseeding it.
+    Missing tables are created, then any column or index declared on a model but absent from its table,
+    then the legacy comma separated post.tags column is moved into post_tag, then the post table is rebuilt
+    if its columns are not stored in model order, then the post_fts search index is built if missing,
+    then any missing default roles,
+    then the tag counters if their table was just created.
+    Safe to run repeatedly.
+    :returns: list of the tables, columns, indexes and rows that were created.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    db.create_all()
+
+    applied = [
+        f"table {table.name}"
+        for table in db.metadata.sorted_tables
+        if table.name not in existing_tables
+    ]
+    with db.engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # created above along with its columns and indexes
+
+            # SQLite can only add nullable columns or ones with a server default, which models must declare.
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"
+                        )
+                    )
+                    applied.append(f"column {table.name}.{column.name}")
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(connection)
+                    applied.append(f"index {index.name}")
+
+        if "post" in existing_tables and "tags" in {
+            c["name"] for c in inspector.get_columns("post")
+        }:
+            migrated = migrate_tags_column(connection)
+            applied.append(f"post_tag rows for {migrated} posts")
+
+        stored_columns = [
+            row.name for row in connection.execute(text("PRAGMA table_info(post)"))
+        ]
+        if stored_columns != [column.name for column in Post.__table__.columns]:
+            rebuild_post_table(connection)
+            applied.append("post table in column order")
+
+        if "post" in existing_tables and "post_fts" not in existing_tables:
+            rebuild_search_index(connection)
+            applied.append("search index post_fts")
+
+        existing_roles = {
+            row.name for row in connection.execute(select(Role.__table__.c.name))
+        }
+        for role_id, name, permissions in DEFAULT_ROLES:
+            if name not in existing_roles:
+                connection.execute(
+                    Role.__table__.insert().values(
+                        id=role_id, name=name, permissions=permissions
+                    )
+                )
+                applied.append(f"role {name}")
+
+    if "tag_count" not in existing_tables:
+        TagCount.rebuild()
+        db.session.commit()
+        applied.append("tag counts")
+
+    return applied
+
+
+def missing_schema(db):
+    """
+    Returns what upgrade would have to create before requests can run: the tables and columns declared
+    on a model but absent from the database, and the post_fts search index. Missing indexes only cost
+    speed and are not listed.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            missing.append(f"table {table.name}")
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        missing.extend(
+            f"column {table.name}.{column.name}"
+            for column in table.columns
+            if column.name not in existing_columns
+        )
+    if "post_fts" not in existing_tables:
+        missing.append("search index post_fts")
+    return missing
+
+
+def migrate_tags_column(connection):
+    """
+    Copies the comma separated post.tags column of databases created before post_tag existed
+    into tag and post_tag, keeping each post's tag order, then drops the column.
+    :returns: the number of posts read.
+    """
+    last_id = 0
+    migrated = 0
+    while True:
+        rows = connection.execute(
+            text(
+                "SELECT id, tags FROM post WHERE id > :last_id ORDER BY id LIMIT :limit"
+            ),
+            {"last_id": last_id, "limit": TAGS_MIGRATION_CHUNK_SIZE},
+        ).all()
+        if not rows:
+            break
+
+        tags_by_post = [
+            (post_id, tags.split(",") if tags else []) for post_id, tags in rows
+        ]
+        tag_ids = Tag.ids_for(
+            (name for _, names in tags_by_post for name in names), connection
+        )
+        post_tag_rows = [
+            {"post_id": post_id, "position": position, "tag_id": tag_ids[name]}
+            for post_id, names in tags_by_post
+            for position, name in enumerate(names)
+        ]
+        if post_tag_rows:
+            connection.execute(PostTag.__table__.insert(), post_tag_rows)
+
+        migrated += len(rows)
+        last_id = rows[-1].id
+
+    connection.execute(text("ALTER TABLE post DROP COLUMN tags"))
+    return migrated
+
+
+def rebuild_post_table(connection):
+    """
+    Recreates post with its columns in model order and copies every row into it, ids included.
+    Columns added by ALTER TABLE land after text, so older databases would otherwise keep reading
+    past a long text's overflow pages to reach them. The indexes and post_fts triggers go with the
+    old table and are created again. Foreign keys are not enforced, so dropping the old table leaves
+    user_post and post_tag alone and their post ids stay valid.
+    """
+    columns = ", ".join(column.name for column in Post.__table__.columns)
+    rebuilt = Post.__table__.to_metadata(MetaData(), name="post_rebuild")
+    connection.execute(CreateTable(rebuilt))
+    connection.execute(
+        text(f"INSERT INTO post_rebuild ({columns}) SELECT {columns} FROM post")
+    )
+    connection.execute(text("DROP TABLE post"))
+    connection.execute(text("ALTER TABLE post_rebuild RENAME TO post"))
+    for index in Post.__table__.indexes:
+        index.create(connection)
+    create_search_index(connection=connection)
+
+
+def hot_queries():
+    """
+    Returns the statements the API runs most often, keyed by a short description, each with the
+    index its plan must use (or a tuple of indexes that serve it equally well) and whether its
+    ORDER BY must be served by that index rather than a sort.
+    Bound values are placeholders, only the shape of each query matters to the planner.
+    """
+    sort_indexes = {
+        "id": "INTEGER PRIMARY KEY",
+        "reads": "ix_post_reads_id",
+        "likes": "ix_post_likes_id",
+        "popularity": "ix_post_popularity_id",
+    }
+    queries = {}
+    for sort_by, index in sort_indexes.items():
+        queries[f"posts by authors sorted by {sort_by}"] = (
+            Post.posts_by_user_ids_query(
+                [1, 2, 3], sort_by, "desc", after=(0, 1), limit=10
+            ).statement,
+            index,
+            True,
+        )
+    for tag_mode in ["any", "all"]:
+        queries[f"posts by authors with {tag_mode} of tags"] = (
+            Post.posts_by_user_ids_query(
+                [1, 2, 3], "id", "asc", limit=10, tags=["a", "b"], tag_mode=tag_mode
+            ).statement,
+            "ix_post_tag_tag_id_post_id",
+            True,
+        )
+    # Relevance and facet counts are computed per query, so these two sort by design.
+    queries["search posts of authors"] = (
+        Post.search_query("travel", [1, 2, 3], "rank", "asc", limit=10).statement,
+        "sqlite_autoindex_user_post_1",
+        False,
+    )
+    queries["tag facets of one author"] = (
+        TagCount.facets_query([1], limit=10),
+        "sqlite_autoindex_author_tag_count_1",
+        False,
+    )
+    queries["tag facets of authors"] = (
+        TagCount.facets_query([1, 2, 3], limit=10),
+        "sqlite_autoindex_user_post_1",
+        False,
+    )
+    queries["posts versions of authors"] = (
+        select(User.id, User.posts_version)
+        .where(User.id.in_([1, 2, 3]))
+        .order_by(User.id),
+        "INTEGER PRIMARY KEY",
+        True,
+    )
+    queries["posts of one author"] = (
+        Post.query.join(UserPost, UserPost.post_id == Post.id)
+        .filter(UserPost.user_id == 1)
+        .statement,
+        "sqlite_autoindex_user_post_1",
+        True,
+    )
+    queries["membership of one author"] = (
+        UserPost.query.filter_by(user_id=1, post_id=1).statement,
+        "sqlite_autoindex_user_post_1",
+        True,
+    )
+    queries["owner check"] = (
+        select(
+            UserPost.query.filter(
+                UserPost.post_id == 1, UserPost.role_id.in_([1])
+            ).exists()
+        ),
+        "ix_user_post_post_id_role_id",
+        True,
+    )
+    queries["authors of one post"] = (
+        User.query.join(UserPost, UserPost.user_id == User.id)
+        .filter(UserPost.post_id == 1)
+        .statement,
+        "ix_user_post_post_id_user_id",
+        True,
+    )
+    queries["remove authors of one post"] = (
+        delete(UserPost).where(UserPost.post_id == 1),
+        ("ix_user_post_post_id_user_id", "ix_user_post_post_id_role_id"),
+        True,
+    )
+    return queries
+
+
+def explain_query_plan(db, statement):
+    """returns the detail column of EXPLAIN QUERY PLAN for a statement"""
+    sql = str(
+        statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+    )
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return [row[-1] for row in rows]
+
+
+FULL_SCAN = re.compile(r"^SCAN (TABLE )?\w+$")
+
+
+def check_query_plans(db):
+    """
+    Runs EXPLAIN QUERY PLAN over hot_queries() and reports, for each query, any full table scan,
+    a plan that does not use the expected index, and a sort the expected index should have served.
+    "SCAN <table> USING INDEX" walks an index in order and is not a full table scan.
+    :returns: list of (description, plan, problems) tuples, problems being empty when the plan is fine.
+    """
+    results = []
+    for description, (statement, index, ordered) in hot_queries().items():
+        plan = explain_query_plan(db, statement)
+        indexes = (index,) if isinstance(index, str) else index
+        problems = [f"full scan: {step}" for step in plan if FULL_SCAN.match(step)]
+        if not any(name in step for name in indexes for step in plan):
+            problems.append(f"does not use {' or '.join(indexes)}")
+        if ordered and "USE TEMP B-TREE FOR ORDER BY" in plan:
+            problems.append(f"sorts instead of reading {indexes[0]} in order")
+        results.append((description, plan, problems))
+    return results
@@ -1,29 +1,87 @@
-from sqlalchemy.orm import validates
+from collections import Counter
+
+from sqlalchemy import bindparam, event, func, inspect, select, tuple_
+from sqlalchemy.orm import lazyload, load_only, selectinload, validates
 from ..shared import db
+from ..search import (
+    create_search_index,
+    drop_search_index,
+    match_expression,
+    matches,
+    post_fts,
+)
+from db.serializers import serializer_for
+from db.models.tag import PostTag, Tag
+from db.models.tag_count import TagCount
 from db.models.user import User
 
+# keys of a serialized post, each named after the Post attribute it is read from.
+POST_FIELDS = ["id", "text", "likes", "reads", "popularity", "tags"]
+
 
 class Post(db.Model):
     __tablename__ = "post"
+    # one index per VALID_SORTS column, with id as the tie-break, so sorted and seeked reads are index ordered.
+    __table_args__ = (
+        db.Index("ix_post_reads_id", "reads", "id"),
+        db.Index("ix_post_likes_id", "likes", "id"),
+        db.Index("ix_post_popularity_id", "popularity", "id"),
+    )
+    serialized_fields = POST_FIELDS
     id = db.Column(db.Integer, primary_key=True)
-    text = db.Column(db.String, nullable=False)
     likes = db.Column(db.Integer, default=0, nullable=False)
     reads = db.Column(db.Integer, default=0, nullable=False)
     popularity = db.Column(db.Float, default=0.0, nullable=False)
+    # incremented by every write to the post, its tags or its authors. Keys the post's cached JSON fragments.
+    version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # declared last so the table stores it after the counters. A long text spills into overflow pages,
+    # which SQLite then only reads when text itself is selected. flask upgrade-db rebuilds older post
+    # tables, whose added columns follow text, into this order.
+    text = db.Column(db.String, nullable=False)
     users = db.relationship("User", secondary="user_post", viewonly=True)
+    # query-returning variant of users, for filtering without loading every author.
+    users_query = db.relationship(
+        "User", secondary="user_post", viewonly=True, lazy="dynamic"
+    )
 
-    # note: comma separated string since sqlite does not support arrays
-    _tags = db.Column("tags", db.String, nullable=False)
+    # tags live in post_tag, one row per tag in list order. selectin loads them for every post
+    # of a query with one extra query, and replacing the list rewrites only this post's rows.
+    tag_links = db.relationship(
+        "PostTag",
+        order_by="PostTag.position",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
 
-    # getter and setter for tags column.
-    # converts list to string when value is set and string to list when value is retrieved.
+    # getter and setter for tags.
+    # converts the post_tag rows to a list of names when retrieved and back when set.
     @property
     def tags(self):
-        return self._tags.split(",")
+        return [link.tag.name for link in self.tag_links]
+
+    @property
+    def tag_ids(self):
+        """set of the ids of this post's tags"""
+        return {link.tag.id for link in self.tag_links}
+
+    @property
+    def author_ids(self):
+        """sorted ids of this post's authors"""
+        return sorted(user.id for user in self.users)
+
+    @property
+    def author_names(self):
+        """usernames of this post's authors, in author_ids order"""
+        return [user.username for user in sorted(self.users, key=lambda user: user.id)]
 
     @tags.setter
     def tags(self, tags):
-        self._tags = ",".join(tags)
+        tags = list(tags)
+        by_name = Tag.for_names(tags)
+        self.tag_links = [
+            PostTag(tag=by_name[name], position=position)
+            for position, name in enumerate(tags)
+        ]
 
     @validates("popularity")
     def validate_popularity(self, key, popularity) -> str:
@@ -31,50 +89,433 @@ class Post(db.Model):
             raise ValueError("Popularity should be between 0 and 1")
         return popularity
 
-    def serialize(self, withUsers=False):
-        # adapted from
-        # https://stackoverflow.com/questions/7102754/jsonify-a-sqlalchemy-result-set-in-flask
-        """returns object in easily serialized (jsonify-able) format"""
-        serialized = {
-            "id": self.id,
-            "text": self.text,
-            "likes": self.likes,
-            "reads": self.reads,
-            "popularity": self.popularity,
-            "tags": self.tags,
-        }
+    def serialize(self, withUsers=False, fields=None, withUsernames=False):
+        """returns object in easily serialized (jsonify-able) format, see Post.serializer"""
+        return Post.serializer(fields, withUsers, withUsernames).serialize(self)
 
+    @staticmethod
+    def serializer(fields=None, withUsers=False, withUsernames=False):
+        """
+        Returns the cached serializer of posts, whose serialize_many serializes a whole page at once.
+        :param fields: optional subset of POST_FIELDS to include. Only these attributes are read,
+            so posts loaded with Post.load_fields are serialized without further queries.
+        :param withUsers: adds "authorIds", the sorted ids of the post's authors.
+        :param withUsernames: adds "authorNames", the authors' usernames in authorIds order.
+            Load posts with Post.load_authors before serializing their authors, or each post queries its own.
+        """
+        fields = list(POST_FIELDS if fields is None else fields)
         if withUsers:
-            user_ids = []
-            for user in self.users:
-                user_ids.append(user.id)
-            serialized["authorIds"] = sorted(user_ids)
+            fields.append("author_ids")
+        if withUsernames:
+            fields.append("author_names")
+        return serializer_for(Post, fields)
 
-        return serialized
+    def __str__(self):
+        # only attributes that are already loaded are shown, printing a post never queries the database.
+        unloaded = inspect(self).unloaded
 
-    @property
-    def serialize_with_users(self):
-        """returns object in easily serialized (jsonify-able format)"""
+        def loaded(attribute):
+            return "<not loaded>" if attribute in unloaded else getattr(self, attribute)
 
-    def __str__(self):
+        users = loaded("users")
+        if not isinstance(users, str):
+            users = sorted(user.id for user in users)
+        tags = "<not loaded>" if "tag_links" in unloaded else self.tags
         self_str = (
             "-----Post-----\n"
-            + f"ID: {self.id}\n"
-            + f"Text: {self.text}\n"
-            + f"Likes: {self.likes}\n"
-            + f"Reads: {self.reads}\n"
-            + f"Popularity: {self.popularity}\n"
-            + f"Tags: {self.tags}\n"
-            + f"Users: {self.users}\n"
+            + f"ID: {loaded('id')}\n"
+            + f"Text: {loaded('text')}\n"
+            + f"Likes: {loaded('likes')}\n"
+            + f"Reads: {loaded('reads')}\n"
+            + f"Popularity: {loaded('popularity')}\n"
+            + f"Tags: {tags}\n"
+            + f"Users: {users}\n"
             "--------------"
         )
         return self_str
 
     @staticmethod
-    def get_posts_by_user_id(user_id):
-        user = User.query.get(user_id)
-        return Post.query.with_parent(user).all()
+    def load_authors(query):
+        """
+        Loads the authors of every post of a query with one extra SELECT ... IN query per page, however
+        many posts it returns. Only the users' id and username are read.
+        """
+        return query.options(selectinload(Post.users).load_only(User.id, User.username))
+
+    @staticmethod
+    def load_fields(query, fields, sort_by="id"):
+        """
+        Restricts a post query to the columns needed to serialize fields, plus id, version and the sort column.
+        Unrequested columns, text above all, are left out of the SELECT and tags are not loaded unless requested.
+        :param fields: subset of POST_FIELDS, or None to load everything.
+        """
+        if fields is None:
+            return query
+        columns = {"id", "version", *fields} - {"tags"}
+        if sort_by in POST_FIELDS:
+            columns.add(sort_by)
+        options = [load_only(*[getattr(Post, column) for column in sorted(columns)])]
+        if "tags" not in fields:
+            options.append(lazyload(Post.tag_links))
+        return query.options(*options)
+
+    @staticmethod
+    def get_posts_by_user_ids(
+        user_ids,
+        sort_by="id",
+        direction="asc",
+        after=None,
+        limit=None,
+        tags=None,
+        tag_mode="any",
+        fields=None,
+        authors=False,
+    ):
+        """
+        Returns the distinct posts written by any of the given users in a single query.
+        Posts are ordered by sort_by with id as the tie-break, both in the given direction.
+
+        :param after: optional (sort_by value, id) pair of the last post of the previous page.
+            Only posts strictly after it in the requested order are returned (keyset seek).
+        :param limit: optional maximum number of posts to return.
+        :param tags: optional list of tag names. Only posts with any (tag_mode "any") or all
+            (tag_mode "all") of them are returned.
+        :param fields: optional subset of POST_FIELDS the posts will be serialized with, see load_fields.
+        :param authors: if True the authors of the posts are loaded too, see load_authors.
+        """
+        return Post.posts_by_user_ids_query(
+            user_ids, sort_by, direction, after, limit, tags, tag_mode, fields, authors
+        ).all()
+
+    @staticmethod
+    def posts_by_user_ids_query(
+        user_ids,
+        sort_by="id",
+        direction="asc",
+        after=None,
+        limit=None,
+        tags=None,
+        tag_mode="any",
+        fields=None,
+        authors=False,
+    ):
+        """returns the query behind get_posts_by_user_ids without executing it"""
+        from db.models.user_post import UserPost
+
+        sort_column = getattr(Post, sort_by)
+        keys = [sort_column] if sort_by == "id" else [sort_column, Post.id]
+
+        # A correlated EXISTS rather than a join keeps post the outer table, so the planner can walk
+        # the (sort_by, id) index in order and stop at limit instead of sorting every matching post.
+        query = Post.query.filter(
+            select(UserPost.post_id)
+            .where(UserPost.post_id == Post.id, UserPost.user_id.in_(user_ids))
+            .exists()
+        )
+        query = Post.load_fields(query, fields, sort_by)
+        if authors:
+            query = Post.load_authors(query)
+        if tags:
+            query = query.filter(
+                Post.id.in_(PostTag.post_ids_with_tags(tags, tag_mode))
+            )
+
+        if after is not None:
+            value, last_id = after
+            if sort_by == "id":
+                position, boundary = Post.id, last_id
+            else:
+                position, boundary = tuple_(*keys), tuple_(value, last_id)
+            if direction == "desc":
+                query = query.filter(position < boundary)
+            else:
+                query = query.filter(position > boundary)
+
+        if direction == "desc":
+            keys = [column.desc() for column in keys]
+        query = query.order_by(*keys)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
 
     @staticmethod
-    def get_post_by_post_id(post_id):
-        return Post.query.get(post_id)
+    def search(
+        q,
+        user_ids=None,
+        sort_by="rank",
+        direction="asc",
+        limit=None,
+        fields=None,
+        authors=False,
+    ):
+        """
+        Returns the posts whose text contains every word of q, through the post_fts index.
+        sort_by is "rank" (relevance, best match first when ascending) or one of the post sort columns,
+        with id as the tie-break. user_ids optionally restricts the results to posts of those authors.
+        fields optionally limits the columns loaded, see load_fields, and authors loads the posts' authors.
+        """
+        query = Post.search_query(
+            q, user_ids, sort_by, direction, limit, fields, authors
+        )
+        return query.all() if query is not None else []
+
+    @staticmethod
+    def search_query(
+        q,
+        user_ids=None,
+        sort_by="rank",
+        direction="asc",
+        limit=None,
+        fields=None,
+        authors=False,
+    ):
+        """returns the query behind search without executing it, or None if q has no words"""
+        from db.models.user_post import UserPost
+
+        expression = match_expression(q)
+        if expression is None:
+            return None
+
+        query = Post.query.join(post_fts, post_fts.c.rowid == Post.id).filter(
+            matches(expression)
+        )
+        query = Post.load_fields(query, fields, sort_by)
+        if authors:
+            query = Post.load_authors(query)
+        if user_ids is not None:
+            query = query.filter(
+                Post.id.in_(
+                    select(UserPost.post_id).where(UserPost.user_id.in_(user_ids))
+                )
+            )
+
+        sort_column = post_fts.c.rank if sort_by == "rank" else getattr(Post, sort_by)
+        keys = [sort_column] if sort_by == "id" else [sort_column, Post.id]
+        if direction == "desc":
+            keys = [key.desc() for key in keys]
+        query = query.order_by(*keys)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        return query
+
+    @staticmethod
+    def create(owner_id, text, tags=None):
+        """
+        Adds a post and its owner's user_post row in one flush, counts its tags and bumps the owner's
+        posts_version. Does not commit.
+        :returns: the new post's id.
+        """
+        from db.models.role import OWNER_ROLE_ID
+        from db.models.user_post import UserPost
+
+        post_values = {"text": text}
+        if tags:
+            post_values["tags"] = tags
+
+        post = Post(**post_values)
+        db.session.add(post)
+        db.session.flush()
+
+        db.session.add(
+            UserPost(user_id=owner_id, post_id=post.id, role_id=OWNER_ROLE_ID)
+        )
+        TagCount.apply(*TagCount.deltas(set(), set(), {owner_id}, post.tag_ids))
+        User.bump_posts_versions([owner_id])
+        return post.id
+
+    @staticmethod
+    def apply_update(post_id, author_ids=None, author_roles=None, tags=None, text=None):
+        """
+        Applies a validated PATCH to a post. Arguments left as None are not changed. Does not commit.
+        Raises OwnerRequired if the new authors would leave the post without an owner.
+        Tag counters are adjusted for the tags and authors that were added or removed, and the
+        posts_version of every previous and new author and the post's version are bumped.
+        """
+        from db.models.user_post import OwnerRequired, UserPost
+
+        post = Post.query.get(post_id)
+        authors_before = UserPost.author_ids(post_id)
+        tags_before = post.tag_ids
+
+        if author_ids is not None:
+            # only the changed user_post rows are written, in the same transaction as the post.
+            UserPost.set_post_authors(post_id, author_ids, author_roles)
+            if not UserPost.post_has_owner(post_id):
+                raise OwnerRequired("A post must always have at least one owner.")
+
+        if tags is not None:
+            post.tags = tags
+
+        if text is not None:
+            post.text = text
+        post.version = Post.version + 1
+
+        authors_after = authors_before if author_ids is None else set(author_ids)
+        if author_ids is not None or tags is not None:
+            TagCount.apply(
+                *TagCount.deltas(
+                    authors_before, tags_before, authors_after, post.tag_ids
+                )
+            )
+        User.bump_posts_versions(authors_before | authors_after)
+
+    @staticmethod
+    def bulk_create(new_posts, owner_id):
+        """
+        Inserts many posts and their post_tag and user_post rows with executemany statements
+        and counts their tags. Bumps the posts_version of every author. Does not commit.
+        :param new_posts: list of {"text": str, "tags": list(str), "author_ids": list(int)} dicts.
+        :param owner_id: id of the user who owns every new post. Co-authors get DEFAULT_AUTHOR_ROLE.
+        :returns: list of the new post ids, in the order of new_posts.
+        """
+        from db.models.role import DEFAULT_AUTHOR_ROLE, OWNER_ROLE_ID, Role
+        from db.models.user_post import UserPost
+
+        # ids are assigned up front, the way SQLite would, so they can be returned in order
+        # without a round trip per row. pysqlite only opens its transaction before the first write,
+        # so the write lock is taken here first: no other writer can insert between the max(id) read
+        # and the inserts.
+        connection = db.session.connection().connection
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+        first_id = (db.session.query(func.max(Post.id)).scalar() or 0) + 1
+        ids = list(range(first_id, first_id + len(new_posts)))
+        co_author_role_id = Role.id_for(DEFAULT_AUTHOR_ROLE)
+        # every tag name of the batch is resolved with one insert and one select.
+        tag_ids = Tag.ids_for(
+            name for new_post in new_posts for name in new_post["tags"]
+        )
+
+        post_rows = []
+        post_tag_rows = []
+        user_post_rows = []
+        tag_deltas, author_tag_deltas = Counter(), Counter()
+        for post_id, new_post in zip(ids, new_posts):
+            post_rows.append(
+                {
+                    "id": post_id,
+                    "text": new_post["text"],
+                    "likes": 0,
+                    "reads": 0,
+                    "popularity": 0.0,
+                    "version": 0,
+                }
+            )
+            for position, name in enumerate(new_post["tags"]):
+                post_tag_rows.append(
+                    {
+                        "post_id": post_id,
+                        "position": position,
+                        "tag_id": tag_ids[name],
+                    }
+                )
+            user_post_rows.append(
+                {"user_id": owner_id, "post_id": post_id, "role_id": OWNER_ROLE_ID}
+            )
+            for author_id in dict.fromkeys(new_post["author_ids"]):
+                if author_id != owner_id:
+                    user_post_rows.append(
+                        {
+                            "user_id": author_id,
+                            "post_id": post_id,
+                            "role_id": co_author_role_id,
+                        }
+                    )
+            post_tag_deltas, post_author_tag_deltas = TagCount.deltas(
+                set(),
+                set(),
+                {owner_id, *new_post["author_ids"]},
+                {tag_ids[name] for name in new_post["tags"]},
+            )
+            tag_deltas.update(post_tag_deltas)
+            author_tag_deltas.update(post_author_tag_deltas)
+
+        db.session.execute(Post.__table__.insert(), post_rows)
+        if post_tag_rows:
+            db.session.execute(PostTag.__table__.insert(), post_tag_rows)
+        db.session.execute(UserPost.__table__.insert(), user_post_rows)
+        TagCount.apply(tag_deltas, author_tag_deltas)
+        User.bump_posts_versions(row["user_id"] for row in user_post_rows)
+        return ids
+
+    @staticmethod
+    def add_counts(deltas):
+        """
+        Adds buffered increments to the likes and reads columns with one executemany UPDATE, so concurrent
+        increments are never lost to a read-modify-write. Bumps the version of the posts and the posts_version
+        of their authors.
+        Does not commit.
+        :param deltas: {post_id: {"likes": int, "reads": int}}, missing fields count as 0.
+        :returns: the number of posts given.
+        """
+        table = Post.__table__
+        statement = (
+            table.update()
+            .where(table.c.id == bindparam("post_id"))
+            .values(
+                likes=table.c.likes + bindparam("likes_delta"),
+                reads=table.c.reads + bindparam("reads_delta"),
+                version=table.c.version + 1,
+            )
+        )
+        db.session.execute(
+            statement,
+            [
+                {
+                    "post_id": post_id,
+                    "likes_delta": post_deltas.get("likes", 0),
+                    "reads_delta": post_deltas.get("reads", 0),
+                }
+                for post_id, post_deltas in deltas.items()
+            ],
+        )
+        User.bump_posts_versions_of_posts(deltas)
+        return len(deltas)
+
+    @staticmethod
+    def set_popularity(post_ids, scores):
+        """
+        Writes many popularity scores with one executemany UPDATE. Does not commit.
+        Bumps the version of each post. Scores change across the whole table at once, so every user's
+        posts_version is bumped.
+        The statement is passed to the driver as is, compiling parameters per row would dominate large batches.
+        :returns: the number of posts given.
+        """
+        db.session.connection().exec_driver_sql(
+            "UPDATE post SET popularity = ?, version = version + 1 WHERE id = ?",
+            list(zip(scores, post_ids)),
+        )
+        User.bump_posts_versions()
+        return len(post_ids)
+
+    @staticmethod
+    def get_posts_by_ids(post_ids, fields=None, authors=False):
+        """
+        Returns the posts with the given ids, in no particular order, with one query.
+        fields and authors select what is loaded, see load_fields and load_authors.
+        """
+        query = Post.load_fields(Post.query, fields)
+        if authors:
+            query = Post.load_authors(query)
+        return query.filter(Post.id.in_(post_ids)).all()
+
+    @staticmethod
+    def exists(post_id):
+        """returns whether a post exists, with a primary key lookup that loads nothing"""
+        return db.session.query(Post.query.filter(Post.id == post_id).exists()).scalar()
+
+    @staticmethod
+    def get_post_by_post_id(post_id, authors=False):
+        """returns the post or None. With authors its authors are loaded by one extra query, see load_authors."""
+        if not authors:
+            return Post.query.get(post_id)
+        return Post.load_authors(Post.query).filter(Post.id == post_id).one_or_none()
+
+
+# post_fts and its triggers are created and dropped along with the post table.
+event.listen(Post.__table__, "after_create", create_search_index)
+event.listen(Post.__table__, "before_drop", drop_search_index)
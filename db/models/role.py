@@ -0,0 +1,121 @@
+import enum
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from ..shared import db
+
+
+class Permission(enum.IntFlag):
+    """Bits of Role.permissions. A role's permissions are the OR of the bits it grants."""
+
+    CREATE = 1
+    READ = 2
+    UPDATE = 4
+    DELETE = 8
+    MANAGE_AUTHORS = 16
+
+
+# (id, name, permissions) of the roles every database starts with. Existing authors become owners.
+DEFAULT_ROLES = [
+    (
+        1,
+        "owner",
+        int(
+            Permission.CREATE
+            | Permission.READ
+            | Permission.UPDATE
+            | Permission.DELETE
+            | Permission.MANAGE_AUTHORS
+        ),
+    ),
+    (2, "editor", int(Permission.READ | Permission.UPDATE)),
+    (3, "viewer", int(Permission.READ)),
+]
+OWNER_ROLE_ID = 1
+# role given to authors added through PATCH /api/posts/<post_id> without an explicit role.
+DEFAULT_AUTHOR_ROLE = "owner"
+
+
+class Role(db.Model):
+    __tablename__ = "role"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True, nullable=False)
+    permissions = db.Column(db.Integer, default=0, nullable=False)
+
+    # role definitions rarely change, so they are cached in-process as id -> (name, permissions).
+    # The commit of any insert, update or delete of a Role clears the cache. Filling and clearing
+    # both hold _cache_lock, so a fill that read the rows before a commit is cleared right after it.
+    _cache = None
+    _cache_lock = threading.Lock()
+
+    @staticmethod
+    def defaults():
+        return [
+            Role(id=role_id, name=name, permissions=permissions)
+            for role_id, name, permissions in DEFAULT_ROLES
+        ]
+
+    @staticmethod
+    def definitions():
+        """returns {role id: (name, permissions)} for every role, querying only on a cache miss"""
+        cache = Role._cache
+        if cache is None:
+            with Role._cache_lock:
+                cache = Role._cache  # filled by another thread while this one waited
+                if cache is None:
+                    cache = {
+                        role.id: (role.name, role.permissions)
+                        for role in db.session.query(
+                            Role.id, Role.name, Role.permissions
+                        )
+                    }
+                    Role._cache = cache
+        return cache
+
+    @staticmethod
+    def clear_cache():
+        with Role._cache_lock:
+            Role._cache = None
+
+    @staticmethod
+    def permissions_for(role_id):
+        """returns the permission bitmask of a role, 0 for an unknown role"""
+        definition = Role.definitions().get(role_id)
+        return definition[1] if definition is not None else 0
+
+    @staticmethod
+    def id_for(name):
+        """returns the id of the role called name, or None"""
+        for role_id, (role_name, _) in Role.definitions().items():
+            if role_name == name:
+                return role_id
+        return None
+
+    @staticmethod
+    def owner_role_ids():
+        """returns the ids of roles that may manage a post's authors, i.e. count as owners"""
+        return [
+            role_id
+            for role_id, (_, permissions) in Role.definitions().items()
+            if permissions & Permission.MANAGE_AUTHORS
+        ]
+
+
+@event.listens_for(Role, "after_insert")
+@event.listens_for(Role, "after_update")
+@event.listens_for(Role, "after_delete")
+def mark_roles_changed(mapper, connection, role):
+    # flush time: the change is not committed yet, so the cache is only cleared once it is.
+    object_session(role).info["roles_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def invalidate_role_cache(session):
+    if session.info.pop("roles_changed", False):
+        Role.clear_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_role_changes(session):
+    session.info.pop("roles_changed", None)
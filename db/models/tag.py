@@ -0,0 +1,76 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..shared import db
+
+NAME_CHUNK_SIZE = 500
+
+
+class Tag(db.Model):
+    __tablename__ = "tag"
+    id = db.Column(db.Integer, primary_key=True)
+    # unique, so a name lookup is an index seek.
+    name = db.Column(db.String, nullable=False, unique=True)
+
+    @staticmethod
+    def ids_for(names, connection=None):
+        """
+        Returns {name: id} for the given tag names, inserting any that do not exist yet.
+        Costs one INSERT OR IGNORE executemany and one IN query per NAME_CHUNK_SIZE names. Does not commit.
+        :param connection: optional connection to run on instead of the session.
+        """
+        if connection is None:
+            connection = db.session
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+
+        connection.execute(
+            sqlite_insert(Tag.__table__).on_conflict_do_nothing(),
+            [{"name": name} for name in names],
+        )
+        tag_ids = {}
+        # chunked to stay under SQLite's bound parameter limit on large batches.
+        for start in range(0, len(names), NAME_CHUNK_SIZE):
+            rows = connection.execute(
+                select(Tag.__table__.c.name, Tag.__table__.c.id).where(
+                    Tag.__table__.c.name.in_(names[start : start + NAME_CHUNK_SIZE])
+                )
+            )
+            tag_ids.update(rows.all())
+        return tag_ids
+
+    @staticmethod
+    def for_names(names):
+        """returns {name: Tag} for the given tag names, creating any that do not exist yet"""
+        tag_ids = Tag.ids_for(names)
+        return {tag.name: tag for tag in Tag.query.filter(Tag.id.in_(tag_ids.values()))}
+
+
+class PostTag(db.Model):
+    __tablename__ = "post_tag"
+    # the primary key keeps each post's tags in order and serves lookups by post,
+    # (tag_id, post_id) serves lookups by tag.
+    __table_args__ = (db.Index("ix_post_tag_tag_id_post_id", "tag_id", "post_id"),)
+    post_id = db.Column(db.Integer, db.ForeignKey("post.id"), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    tag_id = db.Column(db.Integer, db.ForeignKey("tag.id"), nullable=False)
+    tag = db.relationship("Tag", lazy="joined", innerjoin=True)
+
+    @staticmethod
+    def post_ids_with_tags(names, mode="any"):
+        """
+        Returns a select of the ids of posts tagged with any (mode "any") or every (mode "all") of the names.
+        Names are resolved through the unique index on tag.name, posts through ix_post_tag_tag_id_post_id.
+        """
+        names = list(dict.fromkeys(names))
+        query = (
+            select(PostTag.post_id)
+            .join(Tag, Tag.id == PostTag.tag_id)
+            .where(Tag.name.in_(names))
+        )
+        if mode == "all":
+            query = query.group_by(PostTag.post_id).having(
+                func.count(func.distinct(PostTag.tag_id)) == len(names)
+            )
+        return query
@@ -0,0 +1,192 @@
+from collections import Counter
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..shared import db
+from db.models.tag import PostTag, Tag
+
+
+class TagCount(db.Model):
+    """Number of posts carrying each tag. Kept current by the post write paths, see TagCount.apply."""
+
+    __tablename__ = "tag_count"
+    tag_id = db.Column(db.Integer, db.ForeignKey("tag.id"), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
+
+    @staticmethod
+    def deltas(authors_before, tags_before, authors_after, tags_after):
+        """
+        Returns the (tag deltas, author tag deltas) Counters for one post whose authors and tag ids
+        changed from the *_before sets to the *_after sets. Pass empty sets for a new post.
+        """
+        tags_before, tags_after = set(tags_before), set(tags_after)
+        tag_deltas = Counter()
+        for tag_id in tags_after - tags_before:
+            tag_deltas[tag_id] += 1
+        for tag_id in tags_before - tags_after:
+            tag_deltas[tag_id] -= 1
+
+        pairs_before = {(a, t) for a in authors_before for t in tags_before}
+        pairs_after = {(a, t) for a in authors_after for t in tags_after}
+        author_tag_deltas = Counter()
+        for pair in pairs_after - pairs_before:
+            author_tag_deltas[pair] += 1
+        for pair in pairs_before - pairs_after:
+            author_tag_deltas[pair] -= 1
+
+        return tag_deltas, author_tag_deltas
+
+    @staticmethod
+    def apply(tag_deltas, author_tag_deltas):
+        """
+        Adds the deltas to the counters with one upsert executemany per table. Does not commit.
+        :param tag_deltas: {tag_id: delta}
+        :param author_tag_deltas: {(user_id, tag_id): delta}
+        """
+        tag_rows = [
+            {"tag_id": tag_id, "post_count": delta}
+            for tag_id, delta in tag_deltas.items()
+            if delta
+        ]
+        if tag_rows:
+            statement = sqlite_insert(TagCount.__table__)
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["tag_id"],
+                    set_={
+                        "post_count": TagCount.__table__.c.post_count
+                        + statement.excluded.post_count
+                    },
+                ),
+                tag_rows,
+            )
+
+        author_tag_rows = [
+            {"user_id": user_id, "tag_id": tag_id, "post_count": delta}
+            for (user_id, tag_id), delta in author_tag_deltas.items()
+            if delta
+        ]
+        if author_tag_rows:
+            statement = sqlite_insert(AuthorTagCount.__table__)
+            db.session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["user_id", "tag_id"],
+                    set_={
+                        "post_count": AuthorTagCount.__table__.c.post_count
+                        + statement.excluded.post_count
+                    },
+                ),
+                author_tag_rows,
+            )
+
+    @staticmethod
+    def facets(author_ids=None, limit=None):
+        """
+        Returns [(tag name, post count)] ordered by count, highest first, then by name.
+        With author_ids only posts of those authors are counted, each post once however many of them
+        wrote it. One author is read from the per-author counters. Several are counted from the
+        user_post and post_tag indexes on every call, as the counters of co-authors cannot be added up
+        without counting their shared posts twice. GET /api/tags caches these in response_cache.
+        """
+        return db.session.execute(TagCount.facets_query(author_ids, limit)).all()
+
+    @staticmethod
+    def facets_query(author_ids=None, limit=None):
+        """returns the select behind facets without executing it"""
+        from db.models.user_post import UserPost
+
+        if author_ids is not None and len(set(author_ids)) > 1:
+            count = func.count(func.distinct(PostTag.post_id))
+            query = (
+                select(Tag.name, count)
+                .select_from(UserPost)
+                .join(PostTag, PostTag.post_id == UserPost.post_id)
+                .join(Tag, Tag.id == PostTag.tag_id)
+                .where(UserPost.user_id.in_(set(author_ids)))
+                .group_by(Tag.id)
+            )
+        elif author_ids is None:
+            count = TagCount.post_count
+            query = (
+                select(Tag.name, count)
+                .join(TagCount, TagCount.tag_id == Tag.id)
+                .where(count > 0)
+            )
+        else:
+            count = func.sum(AuthorTagCount.post_count)
+            query = (
+                select(Tag.name, count)
+                .join(AuthorTagCount, AuthorTagCount.tag_id == Tag.id)
+                .where(AuthorTagCount.user_id.in_(set(author_ids)))
+                .group_by(Tag.id)
+                .having(count > 0)
+            )
+        query = query.order_by(count.desc(), Tag.name)
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def rebuild():
+        """
+        Recomputes every counter from post_tag and user_post and replaces the stored ones. Does not commit.
+        :returns: the number of counters whose value was wrong.
+        """
+        from db.models.user_post import UserPost
+
+        expected_tags = dict(
+            db.session.execute(
+                select(
+                    PostTag.tag_id, func.count(func.distinct(PostTag.post_id))
+                ).group_by(PostTag.tag_id)
+            ).all()
+        )
+        expected_authors = {
+            (user_id, tag_id): count
+            for user_id, tag_id, count in db.session.execute(
+                select(
+                    UserPost.user_id,
+                    PostTag.tag_id,
+                    func.count(func.distinct(PostTag.post_id)),
+                )
+                .join(UserPost, UserPost.post_id == PostTag.post_id)
+                .group_by(UserPost.user_id, PostTag.tag_id)
+            )
+        }
+
+        stored_tags = dict(
+            db.session.execute(select(TagCount.tag_id, TagCount.post_count)).all()
+        )
+        stored_authors = {
+            (user_id, tag_id): count
+            for user_id, tag_id, count in db.session.execute(
+                select(
+                    AuthorTagCount.user_id,
+                    AuthorTagCount.tag_id,
+                    AuthorTagCount.post_count,
+                )
+            )
+        }
+
+        corrected = sum(
+            expected_tags.get(key, 0) != stored_tags.get(key, 0)
+            for key in expected_tags.keys() | stored_tags.keys()
+        ) + sum(
+            expected_authors.get(key, 0) != stored_authors.get(key, 0)
+            for key in expected_authors.keys() | stored_authors.keys()
+        )
+
+        db.session.execute(delete(TagCount))
+        db.session.execute(delete(AuthorTagCount))
+        TagCount.apply(expected_tags, expected_authors)
+        return corrected
+
+
+class AuthorTagCount(db.Model):
+    """Number of posts of each author carrying each tag. The primary key serves lookups by author."""
+
+    __tablename__ = "author_tag_count"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey("tag.id"), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0)
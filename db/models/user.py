@@ -1,8 +1,10 @@
 from sqlalchemy.orm import validates
-from sqlalchemy import event
+from sqlalchemy import event, inspect, select
 from ..shared import db
+from ..passwords import hasher
 
-import bcrypt
+# post ids per statement when bumping the versions of the authors of many posts.
+VERSION_BUMP_CHUNK_SIZE = 500
 
 
 class User(db.Model):
@@ -11,7 +13,16 @@ class User(db.Model):
     username = db.Column(db.String, unique=True, nullable=False)
     password = db.Column("password", db.String, nullable=False)
     salt = db.Column(db.String, nullable=False)
+    # incremented by every write to one of this user's posts, see posts_versions.
+    # deferred so that loading a user, e.g. on every authenticated request, never reads it.
+    posts_version = db.deferred(
+        db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    )
     posts = db.relationship("Post", secondary="user_post", viewonly=True)
+    # query-returning variant of posts, for filtering without loading every post.
+    posts_query = db.relationship(
+        "Post", secondary="user_post", viewonly=True, lazy="dynamic"
+    )
 
     @validates("password")
     def validate_username(self, key, password) -> str:
@@ -20,21 +31,101 @@ class User(db.Model):
         return password
 
     def correct_password(self, password):
-        return bcrypt.checkpw(password.encode("utf-8"), self.password.encode("utf-8"))
+        return hasher.checkpw(password.encode("utf-8"), self.password.encode("utf-8"))
+
+    @staticmethod
+    def missing_user_ids(user_ids):
+        """returns the ids in user_ids, in order and without repeats, that belong to no user. Uses one query."""
+        found = {
+            row.id for row in db.session.query(User.id).filter(User.id.in_(user_ids))
+        }
+        return [user_id for user_id in dict.fromkeys(user_ids) if user_id not in found]
+
+    @staticmethod
+    def posts_versions(user_ids):
+        """returns [(id, posts_version)] of the given users ordered by id, with one primary key IN query"""
+        return db.session.execute(
+            select(User.id, User.posts_version)
+            .where(User.id.in_(set(user_ids)))
+            .order_by(User.id)
+        ).all()
+
+    @staticmethod
+    def bump_posts_versions(user_ids=None):
+        """Increments posts_version of the given users, or of every user if None. Does not commit."""
+        statement = User.__table__.update().values(
+            posts_version=User.__table__.c.posts_version + 1
+        )
+        if user_ids is not None:
+            user_ids = set(user_ids)
+            if not user_ids:
+                return
+            statement = statement.where(User.__table__.c.id.in_(user_ids))
+        db.session.execute(statement)
+
+    @staticmethod
+    def bump_posts_versions_of_posts(post_ids):
+        """Increments posts_version of every author of the given posts. Does not commit."""
+        from db.models.user_post import UserPost
+
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), VERSION_BUMP_CHUNK_SIZE):
+            authors = select(UserPost.user_id).where(
+                UserPost.post_id.in_(post_ids[start : start + VERSION_BUMP_CHUNK_SIZE])
+            )
+            db.session.execute(
+                User.__table__.update()
+                .where(User.__table__.c.id.in_(authors))
+                .values(posts_version=User.__table__.c.posts_version + 1)
+            )
+
+    @staticmethod
+    def insert_hashed(username, password_hash, salt):
+        """
+        Inserts a user whose password was already hashed with create_password, bypassing the
+        hashing listeners so the insert itself does no bcrypt work. Does not commit.
+        :returns: the new user's id.
+        """
+        result = db.session.execute(
+            User.__table__.insert().values(
+                username=username, password=password_hash, salt=salt
+            )
+        )
+        return result.inserted_primary_key[0]
+
+    @staticmethod
+    def update_hashed(user_id, password_hash, salt):
+        """
+        Replaces a user's password with one already hashed with create_password, bypassing the
+        hashing listeners like insert_hashed. Does not commit.
+        """
+        db.session.execute(
+            User.__table__.update()
+            .where(User.id == user_id)
+            .values(password=password_hash, salt=salt)
+        )
+
+    def needs_rehash(self):
+        """returns whether the stored hash uses a lower bcrypt cost than currently configured"""
+        # bcrypt hashes look like $2b$<cost>$<salt and hash>
+        return int(self.password.split("$")[2]) < hasher.rounds
 
     def isAuthor(self, post):
-        if post in self.posts:
-            return True
-        else:
-            return False
+        """
+        Checks for this user's user_post row with a primary key lookup instead of loading self.posts.
+        The answer is memoized for the rest of the request.
+        """
+        from db.models.user_post import UserPost
+
+        return UserPost.is_author(self.id, post.id)
 
 
 def create_salt():
-    return bcrypt.gensalt()
+    return hasher.gensalt()
 
 
 def create_password(password, salt):
-    return bcrypt.hashpw(password.encode("utf-8"), salt)
+    return hasher.hashpw(password.encode("utf-8"), salt)
 
 
 @event.listens_for(User, "before_insert")
@@ -46,6 +137,9 @@ def set_salt_and_password(mapper, connect, user):
 
 @event.listens_for(User, "before_update")
 def update_salt_and_password(mapper, connect, user):
+    # only hash a newly assigned plain text password, never the stored hash again.
+    if not inspect(user).attrs.password.history.has_changes():
+        return
     _salt = create_salt()
     user.salt = _salt.decode("ascii")
     user.password = create_password(user.password, _salt).decode("ascii")
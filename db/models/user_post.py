@@ -1,7 +1,135 @@
+from flask import g
+from sqlalchemy import and_, bindparam
+
 from ..shared import db
+from db.models.role import DEFAULT_AUTHOR_ROLE, OWNER_ROLE_ID, Role
+
+
+class OwnerRequired(Exception):
+    """Raised when a change would leave a post without any author in an owner role."""
 
 
 class UserPost(db.Model):
     __tablename__ = "user_post"
+    # the primary key already covers (user_id, post_id) lookups, these cover lookups by post.
+    __table_args__ = (
+        db.Index("ix_user_post_post_id_user_id", "post_id", "user_id"),
+        db.Index("ix_user_post_post_id_role_id", "post_id", "role_id"),
+    )
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey("post.id"), primary_key=True)
+    role_id = db.Column(
+        db.Integer,
+        db.ForeignKey("role.id"),
+        nullable=False,
+        default=OWNER_ROLE_ID,
+        server_default=str(OWNER_ROLE_ID),
+    )
+
+    @property
+    def permissions(self):
+        """permission bitmask of this author's role, served from the in-process role cache"""
+        return Role.permissions_for(self.role_id)
+
+    @staticmethod
+    def membership(user_id, post_id):
+        """
+        Returns the user_post row of a user on a post, or None, with one primary key lookup.
+        Rows are memoized on flask.g so repeated checks within one request cost nothing.
+        """
+        memo = g.setdefault("memberships", {})
+        key = (user_id, post_id)
+        if key not in memo:
+            memo[key] = UserPost.query.get(key)
+        return memo[key]
+
+    @staticmethod
+    def is_author(user_id, post_id):
+        """returns whether the user is listed on the post in any role"""
+        return UserPost.membership(user_id, post_id) is not None
+
+    @staticmethod
+    def post_has_owner(post_id):
+        """
+        Returns whether any author of the post holds an owner role.
+        Probes the (post_id, role_id) index rather than reading every author of the post.
+        """
+        return db.session.query(
+            UserPost.query.filter(
+                UserPost.post_id == post_id,
+                UserPost.role_id.in_(Role.owner_role_ids()),
+            ).exists()
+        ).scalar()
+
+    @staticmethod
+    def author_ids(post_id):
+        """returns the set of ids of a post's authors, read from ix_user_post_post_id_user_id alone"""
+        return {
+            user_id
+            for (user_id,) in db.session.query(UserPost.user_id).filter(
+                UserPost.post_id == post_id
+            )
+        }
+
+    @staticmethod
+    def set_post_authors(post_id, author_ids, role_ids=None):
+        """
+        Makes author_ids the authors of a post by diffing against the current user_post rows.
+        Only rows for removed, added or re-assigned authors are written. Does not commit.
+        :param role_ids: optional {user id: role id}. Authors added without one get DEFAULT_AUTHOR_ROLE,
+            authors already on the post keep their role unless given one.
+        :returns: (added, removed) sets of user ids.
+        """
+        role_ids = role_ids or {}
+        current = dict(
+            db.session.query(UserPost.user_id, UserPost.role_id).filter(
+                UserPost.post_id == post_id
+            )
+        )
+        wanted = set(author_ids)
+        added, removed = wanted - current.keys(), current.keys() - wanted
+        reassigned = {
+            user_id
+            for user_id in wanted & current.keys()
+            if user_id in role_ids and role_ids[user_id] != current[user_id]
+        }
+
+        memo = g.setdefault("memberships", {})
+        for user_id in added | removed | reassigned:
+            memo.pop((user_id, post_id), None)
+
+        if removed:
+            UserPost.query.filter(
+                UserPost.post_id == post_id, UserPost.user_id.in_(removed)
+            ).delete(synchronize_session=False)
+        if added:
+            default_role_id = Role.id_for(DEFAULT_AUTHOR_ROLE)
+            db.session.execute(
+                UserPost.__table__.insert(),
+                [
+                    {
+                        "user_id": user_id,
+                        "post_id": post_id,
+                        "role_id": role_ids.get(user_id, default_role_id),
+                    }
+                    for user_id in sorted(added)
+                ],
+            )
+        if reassigned:
+            table = UserPost.__table__
+            db.session.execute(
+                table.update()
+                .where(
+                    and_(
+                        table.c.user_id == bindparam("member_id"),
+                        table.c.post_id == post_id,
+                    )
+                )
+                .values(role_id=bindparam("new_role_id")),
+                [
+                    {"member_id": user_id, "new_role_id": role_ids[user_id]}
+                    for user_id in sorted(reassigned)
+                ],
+            )
+
+        return added, removed
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+import metrics
+
+
+class HashPoolFull(Exception):
+    """Raised when the password hashing pool already has as many jobs queued as it accepts."""
+
+
+def _hashpw(password, salt):
+    # runs in a pool worker. Returns when the worker picked the job up so queue wait can be measured.
+    started = time.time()
+    hashed = bcrypt.hashpw(password, salt)
+    return hashed, started, time.time() - started
+
+
+def _checkpw(password, hashed):
+    started = time.time()
+    matches = bcrypt.checkpw(password, hashed)
+    return matches, started, time.time() - started
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a dedicated, size-limited process pool,
+    so that a burst of logins cannot tie up the request threads with CPU-bound work.
+    At most max_queue jobs may be pending at once, further jobs raise HashPoolFull.
+    A pool broken by a dying worker is replaced and the job retried once.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.rounds = 12
+        self.pool_size = os.cpu_count() or 1
+        self.max_queue = 4 * self.pool_size
+        self.queue_wait = metrics.Timing()
+        self.hash_time = metrics.Timing()
+        self.rejected = 0
+        self.pool_restarts = 0
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """applies BCRYPT_ROUNDS and the HASH_POOL_* settings from app config"""
+        self.enabled = app.config["HASH_POOL_ENABLED"]
+        self.rounds = app.config["BCRYPT_ROUNDS"]
+        if (app.config["HASH_POOL_SIZE"], app.config["HASH_POOL_MAX_QUEUE"]) != (
+            self.pool_size,
+            self.max_queue,
+        ):
+            self.shutdown()
+            self.pool_size = app.config["HASH_POOL_SIZE"]
+            self.max_queue = app.config["HASH_POOL_MAX_QUEUE"]
+            self._slots = threading.BoundedSemaphore(self.max_queue)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def gensalt(self):
+        return bcrypt.gensalt(self.rounds)
+
+    def hashpw(self, password, salt):
+        """returns the bcrypt hash of password (bytes) with salt (bytes)"""
+        return self._run(_hashpw, password, salt)
+
+    def checkpw(self, password, hashed):
+        """returns whether password (bytes) matches the bcrypt hash hashed (bytes)"""
+        return self._run(_checkpw, password, hashed)
+
+    def stats(self):
+        """returns the pool counters in an easily serialized (jsonify-able) format"""
+        return {
+            "enabled": self.enabled,
+            "rounds": self.rounds,
+            "poolSize": self.pool_size,
+            "maxQueue": self.max_queue,
+            "rejected": self.rejected,
+            "poolRestarts": self.pool_restarts,
+            "queueWait": self.queue_wait.stats(),
+            "hashTime": self.hash_time.stats(),
+        }
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+            return self._executor
+
+    def _run(self, job, *args):
+        submitted = time.time()
+        if not self.enabled:
+            result, started, duration = job(*args)
+        else:
+            if not self._slots.acquire(blocking=False):
+                with self._lock:
+                    self.rejected += 1
+                raise HashPoolFull("Too many password hashing requests are queued")
+            try:
+                result, started, duration = self._submit(job, *args)
+            finally:
+                self._slots.release()
+
+        self.queue_wait.observe(max(started - submitted, 0.0))
+        self.hash_time.observe(duration)
+        return result
+
+    def _submit(self, job, *args):
+        executor = self._pool()
+        try:
+            return executor.submit(job, *args).result()
+        except BrokenProcessPool:
+            # a worker died, e.g. killed for memory. The executor cannot recover, so replace it once.
+            self._replace_pool(executor)
+            return self._pool().submit(job, *args).result()
+
+    def _replace_pool(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.pool_restarts += 1
+        broken.shutdown(wait=False)
+
+
+hasher = PasswordHasher()
+metrics.register("passwordHashing", hasher.stats)
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+
+import metrics
+import response_cache
+from db.shared import db
+from db.writes import writes
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SQL = (
+    "SELECT id, likes, reads, popularity FROM post WHERE id > ? ORDER BY id LIMIT ?"
+)
+
+
+def popularity_scores(likes, reads, max_likes, max_reads, likes_weight, reads_weight):
+    """
+    Vectorized popularity of many posts, in [0, 1].
+    Likes and reads are log scaled against the largest value of any post, so a handful of viral posts do not
+    flatten everyone else to 0, then combined as a weighted average.
+    :param likes: array of like counts.
+    :param reads: array of read counts, same shape as likes.
+    """
+    likes_scale = np.log1p(max_likes) or 1.0
+    reads_scale = np.log1p(max_reads) or 1.0
+    total_weight = (likes_weight + reads_weight) or 1.0
+    scores = (
+        likes_weight * np.log1p(likes) / likes_scale
+        + reads_weight * np.log1p(reads) / reads_scale
+    ) / total_weight
+    return np.clip(scores, 0.0, 1.0)
+
+
+class PopularityEngine:
+    """
+    Recomputes Post.popularity from likes and reads for every post.
+
+    Posts are read in id order chunk_size at a time as NumPy arrays, scored with popularity_scores and only the
+    posts whose score changed are written back, one executemany UPDATE and one commit per chunk. Memory stays
+    bounded by chunk_size and the writer lock is never held for the whole table.
+    With an interval set the engine also runs every interval seconds in a background thread.
+    """
+
+    def __init__(self):
+        self.likes_weight = 0.7
+        self.reads_weight = 0.3
+        self.chunk_size = 100000
+        self.interval = 0
+        self.runs = 0
+        self.last_run = {}
+        self.run_time = metrics.Timing()
+        self._app = None
+        self._thread = None
+        self._stop = None  # Event that stops the current periodic thread
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """applies the POPULARITY_* settings from app config and starts the periodic job if configured"""
+        self.likes_weight = app.config["POPULARITY_LIKES_WEIGHT"]
+        self.reads_weight = app.config["POPULARITY_READS_WEIGHT"]
+        self.chunk_size = app.config["POPULARITY_CHUNK_SIZE"]
+        self.interval = app.config["POPULARITY_INTERVAL"]
+        self._app = app
+
+        with self._lock:
+            if self._thread is not None:
+                self._stop.set()
+                self._thread = None
+            if self.interval > 0:
+                self._stop = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(self._stop, self.interval),
+                    name="popularity",
+                    daemon=True,
+                )
+                self._thread.start()
+
+    def recompute(self):
+        """
+        Scores every post and writes back the changed scores. Must run inside an app context.
+        :returns: {"posts": int, "updated": int, "seconds": float}
+        """
+        from db.models.post import Post
+
+        started = time.perf_counter()
+        max_likes, max_reads = db.session.execute(
+            select(func.max(Post.likes), func.max(Post.reads))
+        ).one()
+        max_likes, max_reads = max_likes or 0, max_reads or 0
+
+        # chunks are read straight from the DBAPI cursor. Building a Row object per post costs
+        # more than the scoring itself, and NumPy only needs the plain tuples.
+        posts = updated = 0
+        last_id = 0
+        while True:
+            # each chunk's write commits, which releases the session's connection, so a cursor is opened per chunk.
+            cursor = db.session.connection().connection.cursor()
+            cursor.execute(CHUNK_SQL, (last_id, self.chunk_size))
+            rows = cursor.fetchall()
+            cursor.close()
+            if not rows:
+                break
+
+            chunk = np.array(rows, dtype=np.float64)
+            ids = chunk[:, 0].astype(np.int64)
+            scores = popularity_scores(
+                chunk[:, 1],
+                chunk[:, 2],
+                max_likes,
+                max_reads,
+                self.likes_weight,
+                self.reads_weight,
+            )
+            changed = ~np.isclose(scores, chunk[:, 3], rtol=0.0, atol=1e-9)
+            if changed.any():
+                writes.submit(
+                    Post.set_popularity, ids[changed].tolist(), scores[changed].tolist()
+                )
+
+            posts += len(rows)
+            updated += int(changed.sum())
+            last_id = int(ids[-1])
+
+        if updated:
+            # too many posts change at once to invalidate their authors one by one.
+            response_cache.clear()
+
+        seconds = time.perf_counter() - started
+        self.run_time.observe(seconds)
+        self.runs += 1
+        self.last_run = {"posts": posts, "updated": updated, "seconds": seconds}
+        return self.last_run
+
+    def stats(self):
+        """returns the engine counters in an easily serialized (jsonify-able) format"""
+        return {
+            "intervalS": self.interval,
+            "chunkSize": self.chunk_size,
+            "runs": self.runs,
+            "lastRun": self.last_run,
+            "runTime": self.run_time.stats(),
+        }
+
+    def _run(self, stop, interval):
+        while not stop.wait(interval):
+            try:
+                with self._app.app_context():
+                    self.recompute()
+            except Exception:
+                logger.exception("recomputing post popularity failed")
+
+
+popularity = PopularityEngine()
+metrics.register("popularity", popularity.stats)
@@ -0,0 +1,121 @@
+import logging
+import os
+import re
+import weakref
+
+from sqlalchemy import event
+
+# pragmas applied to every new SQLite connection, in this order.
+# journal_mode goes first since synchronous=NORMAL is only durable enough under WAL.
+PRAGMA_NAMES = [
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "busy_timeout",
+    "temp_store",
+]
+
+PROFILES = {
+    # concurrent readers alongside one writer, no fsync per commit, 64 MiB page cache,
+    # 256 MiB memory mapped reads and a 5 s wait for the write lock instead of "database is locked".
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+    # leave SQLite's own defaults alone.
+    "sqlite-defaults": {},
+}
+
+# the checked-in sample database. journal_mode=WAL is stored in the database file itself, so unless
+# SQLITE_PROFILE asks for another profile this file, like any database under TESTING, keeps sqlite-defaults.
+SAMPLE_DATABASE_URI = "sqlite:///database.db"
+
+_VALUE = re.compile(r"^-?\w+$")
+
+# engine -> its connect listener, so initializing an app again replaces the listener instead of adding one.
+_listeners = weakref.WeakKeyDictionary()
+
+
+def load_config(app):
+    """
+    Sets SQLITE_PRAGMAS from the SQLITE_PROFILE profile, then from any SQLITE_<PRAGMA> overrides,
+    e.g. SQLITE_SYNCHRONOUS=FULL. Both are read from the environment. Without SQLITE_PROFILE the
+    profile is production, or sqlite-defaults for SAMPLE_DATABASE_URI and under TESTING.
+    """
+    default = "production"
+    if app.config["SQLALCHEMY_DATABASE_URI"] == SAMPLE_DATABASE_URI or app.testing:
+        default = "sqlite-defaults"
+    profile = os.environ.get("SQLITE_PROFILE", default)
+    if profile not in PROFILES:
+        raise ValueError(
+            f"Unknown SQLITE_PROFILE {profile}. Must be one of {list(PROFILES)}"
+        )
+
+    pragmas = dict(PROFILES[profile])
+    for name in PRAGMA_NAMES:
+        value = os.environ.get(f"SQLITE_{name.upper()}")
+        if value:
+            pragmas[name] = value
+
+    app.config["SQLITE_PROFILE"] = profile
+    app.config["SQLITE_PRAGMAS"] = pragmas
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    for name in PRAGMA_NAMES:
+        if name in pragmas:
+            value = str(pragmas[name])
+            if not _VALUE.match(value):
+                raise ValueError(f"Invalid value {value!r} for SQLite pragma {name}")
+            cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def effective_pragmas(connection):
+    """returns the value SQLite reports for every tunable pragma on a connection"""
+    return {
+        name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+        for name in PRAGMA_NAMES
+    }
+
+
+def init_app(app, db):
+    """
+    Applies app.config["SQLITE_PRAGMAS"] to each new connection of the app's engine from now on,
+    then logs the pragmas SQLite actually uses at INFO level, in production too.
+    Engines of other apps are left alone. db.init_app gives the app a new engine, so call this after it.
+    """
+    with app.app_context():
+        engine = db.get_engine()
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = dict(app.config["SQLITE_PRAGMAS"])
+
+    def on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+
+    previous = _listeners.pop(engine, None)
+    if previous is not None:
+        event.remove(engine, "connect", previous)
+    event.listen(engine, "connect", on_connect)
+    _listeners[engine] = on_connect
+    engine.dispose()  # pooled connections were opened without these pragmas
+
+    with engine.connect() as connection:
+        effective = effective_pragmas(connection)
+
+    # app.logger inherits WARNING from the root logger outside debug mode, which would drop this line.
+    logger = app.logger.getChild("pragmas")
+    logger.setLevel(logging.INFO)
+    logger.info(
+        "SQLite profile %s, effective pragmas: %s",
+        app.config["SQLITE_PROFILE"],
+        ", ".join(f"{name}={value}" for name, value in effective.items()),
+    )
@@ -0,0 +1,58 @@
+from sqlalchemy import column, literal_column, table, text
+
+# lightweight handle for queries. post_fts is not in db.metadata, create_all must not try to create it.
+post_fts = table("post_fts", column("rowid"), column("rank"))
+
+# post_fts is an FTS5 external content table: it stores only the index, the text stays in post.
+# the triggers keep it in sync with every insert, delete and text update of post, including the
+# executemany inserts of Post.bulk_create.
+SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5(text, content='post', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_insert AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_delete AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS post_fts_update AFTER UPDATE OF text ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        INSERT INTO post_fts(rowid, text) VALUES (new.id, new.text);
+    END""",
+]
+
+
+def create_search_index(target=None, connection=None, **kw):
+    """
+    Creates post_fts and its triggers if they do not exist. Also an after_create listener of the post table,
+    so create_all and seed.reset set it up along with post.
+    """
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+
+
+def drop_search_index(target=None, connection=None, **kw):
+    """drops post_fts. before_drop listener of the post table, the triggers go with post itself."""
+    connection.execute(text("DROP TABLE IF EXISTS post_fts"))
+
+
+def rebuild_search_index(connection):
+    """creates post_fts if needed and re-indexes the text of every post"""
+    create_search_index(connection=connection)
+    connection.execute(text("INSERT INTO post_fts(post_fts) VALUES ('rebuild')"))
+
+
+def match_expression(q):
+    """
+    Turns free text into an FTS5 query that matches posts containing every word, in any order.
+    Words are quoted so characters such as '-', '*' or '"' are treated as text, not parsed as query syntax.
+    :returns: the MATCH expression, or None if q has no words.
+    """
+    words = q.split()
+    if not words:
+        return None
+    return " ".join('"' + word.replace('"', '""') + '"' for word in words)
+
+
+def matches(expression):
+    """returns the `post_fts MATCH :expression` clause"""
+    return literal_column("post_fts").op("MATCH")(expression)
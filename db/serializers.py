@@ -0,0 +1,61 @@
+import threading
+from operator import attrgetter
+
+from sqlalchemy import inspect
+
+from db.utils import to_camel_case
+
+
+class Serializer:
+    """
+    Turns model instances into dicts with fixed camelCase keys.
+
+    Keys are computed once, when the serializer is built, and values are read with a single attrgetter
+    over every field, so serializing a row is one C-level call plus one dict construction. Fields are
+    attribute names and may be properties as well as columns, e.g. Post.tags.
+    Build serializers through serializer_for, which keeps one per model and field list.
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self.keys = tuple(to_camel_case(field) for field in self.fields)
+        getter = attrgetter(*self.fields) if self.fields else None
+        if len(self.fields) > 1:
+            self._values = getter
+        elif getter is not None:
+            # attrgetter of a single name returns the value itself, not a 1-tuple.
+            self._values = lambda row: (getter(row),)
+        else:
+            self._values = lambda row: ()
+
+    def serialize(self, row):
+        """returns row in easily serialized (jsonify-able) format"""
+        return dict(zip(self.keys, self._values(row)))
+
+    def serialize_many(self, rows):
+        """returns a list with every row serialized, in order"""
+        keys, values = self.keys, self._values
+        return [dict(zip(keys, values(row))) for row in rows]
+
+
+_serializers = {}
+_lock = threading.Lock()
+
+
+def serializer_for(model, fields=None):
+    """
+    Returns the cached Serializer of model for the given attribute names.
+    fields defaults to the model's serialized_fields if it declares them, otherwise to every column
+    attribute in mapper order.
+    """
+    key = (model, None if fields is None else tuple(fields))
+    serializer = _serializers.get(key)
+    if serializer is None:
+        if fields is None:
+            fields = getattr(model, "serialized_fields", None) or [
+                attribute.key for attribute in inspect(model).column_attrs
+            ]
+        with _lock:
+            serializer = _serializers.setdefault(key, Serializer(model, fields))
+    return serializer
@@ -6,15 +6,17 @@ def to_camel_case(snake_str):
 
 
 def row_to_dict(row):
-    result = {}
-    for column in row.__table__.columns:
-        result[to_camel_case(column.name)] = getattr(row, column.name)
+    """serializes every column of row, through the cached serializer of its model"""
+    from db.serializers import serializer_for
 
-    return result
+    return serializer_for(type(row)).serialize(row)
 
 
 def rows_to_list(rows):
-    results = []
-    for row in rows:
-        results.append(row_to_dict(row))
-    return results
+    """serializes every column of each row. All rows must be instances of the same model."""
+    from db.serializers import serializer_for
+
+    rows = list(rows)
+    if not rows:
+        return []
+    return serializer_for(type(rows[0])).serialize_many(rows)
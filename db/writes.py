@@ -0,0 +1,174 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+import metrics
+from db.shared import db
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueTimeout(Exception):
+    """Raised when a queued write has not been picked up by the writer thread within timeout seconds."""
+
+
+class WriteQueue:
+    """
+    Optional group commit for SQLite writes. SQLite allows a single writer at a time, so instead of
+    every request committing on its own, jobs are handed to one writer thread which runs up to
+    max_batch of them in a single transaction and commits once. If any job in a batch fails the
+    batch is rolled back and its jobs are re-run one transaction each, so every caller gets back
+    exactly its own result or exception.
+
+    A job is a callable that writes through db.session and returns plain values (ids, not ORM objects).
+    Jobs run without a request context and must not commit themselves.
+    When the queue is disabled submit runs the job and commits in the calling thread.
+    A caller waits at most timeout seconds for the writer thread to take its job. A batch that fails
+    outside its jobs, e.g. when the rollback itself raises, hands that error to every caller still waiting.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.max_batch = 64
+        self.max_wait = 0.002
+        self.timeout = 30.0
+        self.batches = 0
+        self.jobs = 0
+        self.retried_batches = 0
+        self.batch_time = metrics.Timing()
+        self._app = None
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """applies the WRITE_QUEUE_* settings from app config"""
+        self.enabled = app.config["WRITE_QUEUE_ENABLED"]
+        self.max_batch = app.config["WRITE_QUEUE_MAX_BATCH"]
+        self.max_wait = app.config["WRITE_QUEUE_MAX_WAIT_MS"] / 1000
+        self.timeout = app.config["WRITE_QUEUE_TIMEOUT_MS"] / 1000
+        self._app = app
+
+    def submit(self, job, *args):
+        """
+        Runs job(*args) in a committed transaction and returns its result, or raises its exception.
+        Raises WriteQueueTimeout, without running the job, if the writer thread has not taken it within timeout.
+        """
+        if not self.enabled:
+            try:
+                result = job(*args)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return result
+
+        future = Future()
+        self._queue.put((job, args, future))
+        self._start()
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # a job already running in a batch can no longer be cancelled, its outcome is only a batch away.
+            if not future.cancel():
+                return future.result()
+            raise WriteQueueTimeout(
+                f"write not started within {self.timeout:g}s"
+            ) from None
+
+    def stats(self):
+        """returns the queue counters in an easily serialized (jsonify-able) format"""
+        with self._lock:
+            batches, jobs, retried_batches = (
+                self.batches,
+                self.jobs,
+                self.retried_batches,
+            )
+        return {
+            "enabled": self.enabled,
+            "maxBatch": self.max_batch,
+            "maxWaitMs": self.max_wait * 1000,
+            "timeoutMs": self.timeout * 1000,
+            "pending": self._queue.qsize(),
+            "batches": batches,
+            "jobs": jobs,
+            "avgBatchSize": jobs / batches if batches else 0.0,
+            "retriedBatches": retried_batches,
+            "batchTime": self.batch_time.stats(),
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="write-queue", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(
+                        self._queue.get(timeout=remaining)
+                        if remaining > 0
+                        else self._queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+
+            # jobs whose caller timed out were cancelled and are dropped unrun.
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            try:
+                # a fresh app context per batch gives it a fresh session and flask.g.
+                with self._app.app_context():
+                    self._commit_batch(batch)
+            except BaseException as e:
+                logger.exception("write batch of %d jobs failed", len(batch))
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+            self.batch_time.observe(time.perf_counter() - started)
+            with self._lock:
+                self.batches += 1
+                self.jobs += len(batch)
+
+    def _commit_batch(self, batch):
+        try:
+            results = [job(*args) for job, args, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][2].set_exception(e)
+                return
+            with self._lock:
+                self.retried_batches += 1
+            for job, args, future in batch:
+                try:
+                    result = job(*args)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            return
+
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+writes = WriteQueue()
+metrics.register("writeQueue", writes.stats)
@@ -0,0 +1,117 @@
+import re
+
+from flask.json import JSONEncoder
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # optional, responses are encoded with the stdlib json module without it
+    orjson = None
+
+JSON_ENCODERS = ["auto", "orjson", "stdlib"]
+
+# repr() writes floats in positional notation in this range of magnitudes and orjson writes them the same.
+# Outside of it both use exponents, but orjson without "+" or zero padding ("1e16" for "1e+16"), and
+# orjson keeps small numbers positional ("0.00001" for "1e-05").
+ORJSON_SAFE_FLOATS = (1e-4, 1e16)
+NON_ASCII = re.compile(r"[^\x00-\x7e]")
+
+_stats = {"encoder": "stdlib", "fastEncodes": 0, "fallbacks": 0}
+metrics.register("jsonEncoder", lambda: dict(_stats))
+
+
+def init_app(app):
+    """
+    Picks the JSON encoder of jsonify from JSON_ENCODER: "orjson", "stdlib", or "auto" for orjson when
+    it is installed. Raises RuntimeError if "orjson" is asked for but not installed.
+    """
+    choice = app.config["JSON_ENCODER"]
+    if choice not in JSON_ENCODERS:
+        raise RuntimeError(f"JSON_ENCODER must be one of {JSON_ENCODERS}, got {choice}")
+    if choice == "orjson" and orjson is None:
+        raise RuntimeError("JSON_ENCODER is orjson but orjson is not installed")
+
+    if choice != "stdlib" and orjson is not None:
+        app.json_encoder = OrjsonEncoder
+        _stats["encoder"] = "orjson"
+    else:
+        app.json_encoder = JSONEncoder
+        _stats["encoder"] = "stdlib"
+
+
+def _escape_non_ascii(match):
+    # same \\uXXXX escapes, surrogate pairs included, as json.dumps with ensure_ascii.
+    code = ord(match.group())
+    if code < 0x10000:
+        return "\\u{0:04x}".format(code)
+    code -= 0x10000
+    return "\\u{0:04x}\\u{1:04x}".format(
+        0xD800 | (code >> 10) & 0x3FF, 0xDC00 | code & 0x3FF
+    )
+
+
+class OrjsonEncoder(JSONEncoder):
+    """
+    Flask's JSON encoder with orjson doing the work for compact output, the format jsonify uses
+    outside of debug mode.
+
+    Output is byte for byte what the stdlib encoder produces. Anything orjson would encode differently
+    is handed to the stdlib encoder: indented output, values orjson does not support or would convert
+    itself (dates, dataclasses, subclasses of builtins, integers beyond 64 bit, non-string keys) and
+    floats orjson formats differently, see ORJSON_SAFE_FLOATS, NaN and infinity included. Floats are
+    checked on the values before encoding, so the text of posts never causes a fallback.
+    """
+
+    def encode(self, o):
+        if (
+            self.indent is not None
+            or self.item_separator != ","
+            or self.key_separator != ":"
+        ):
+            return super().encode(o)
+
+        option = (
+            orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+            | orjson.OPT_PASSTHROUGH_SUBCLASS
+        )
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        encoded = None
+        if not _has_unsafe_float(o):
+            try:
+                encoded = orjson.dumps(o, default=_unsupported, option=option)
+            except TypeError:
+                pass
+        if encoded is None:
+            _stats["fallbacks"] += 1
+            return super().encode(o)
+
+        _stats["fastEncodes"] += 1
+        encoded = encoded.decode("utf-8")
+        if self.ensure_ascii and (not encoded.isascii() or "\x7f" in encoded):
+            encoded = NON_ASCII.sub(_escape_non_ascii, encoded)
+        return encoded
+
+
+def _unsupported(o):
+    raise TypeError
+
+
+def _has_unsafe_float(o):
+    """returns whether o holds a float orjson would write differently from repr(), see ORJSON_SAFE_FLOATS"""
+    kind = type(o)
+    if kind is float:
+        low, high = ORJSON_SAFE_FLOATS
+        # NaN fails every comparison and is reported too.
+        return o != 0.0 and not low <= abs(o) < high
+    if kind is dict:
+        o = o.values()
+    elif kind is not list and kind is not tuple:
+        return False
+    for value in o:
+        kind = type(value)
+        if kind is not str and kind is not int and _has_unsafe_float(value):
+            return True
+    return False
@@ -0,0 +1,48 @@
+import threading
+
+# name -> callable returning that component's counters, see register and snapshot
+_sources = {}
+
+
+class Timing:
+    """Thread-safe running count, total and maximum of observed durations in seconds."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def stats(self):
+        """returns the timing in milliseconds in an easily serialized (jsonify-able) format"""
+        return {
+            "count": self.count,
+            "totalMs": self.total * 1000,
+            "avgMs": self.total * 1000 / self.count if self.count else 0.0,
+            "maxMs": self.max * 1000,
+        }
+
+
+def register(name, source):
+    """
+    Exposes a component's counters under name in snapshot().
+    :param source: zero argument callable returning a jsonify-able dict.
+    """
+    _sources[name] = source
+
+
+def snapshot():
+    """returns the current counters of every registered component"""
+    return {name: source() for name, source in _sources.items()}
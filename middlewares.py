@@ -1,23 +1,76 @@
-import os
+import time
 from functools import wraps
-from flask import request, jsonify, g
+from flask import current_app, request, jsonify, g
 import jwt
+from sqlalchemy import event
 from sqlalchemy.exc import NoResultFound
 
+import metrics
+from cache import LRUCache
 from db.models.user import User
+from db.shared import db
+
+# verified token -> detached User, so repeated requests with one token skip jwt.decode and the user query.
+token_cache = LRUCache()
+metrics.register("authCache", token_cache.stats)
+
+
+def init_app(app):
+    """sizes the token cache from app config. AUTH_CACHE_ENABLED turns it off entirely."""
+    token_cache.maxsize = app.config["AUTH_CACHE_SIZE"]
+    token_cache.ttl = app.config["AUTH_CACHE_TTL"]
+    token_cache.clear()
+    token_cache.reset_stats()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_tokens(mapper, connection, user):
+    token_cache.invalidate_tag(("user", user.id))
+
+
+def user_from_token(token):
+    """
+    Returns the User a token was issued for, attached to the current session.
+    Returns None if the token carries no user id. Raises if the token is invalid or the user is gone.
+    """
+    config = current_app.config
+    use_cache = config["AUTH_CACHE_ENABLED"]
+
+    cached_user = token_cache.get(token) if use_cache else None
+    if cached_user is not None:
+        return db.session.merge(cached_user, load=False)
+
+    payload = jwt.decode(token, config["SESSION_SECRET"], algorithms=["HS256"])
+    user_id = payload["id"]
+    if not user_id:
+        return None
+
+    user = User.query.filter(User.id == user_id).one()
+    if not use_cache:
+        return user
+
+    # never keep a token in the cache past its own expiry.
+    ttl = token_cache.ttl
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl <= 0:
+        return user
+
+    db.session.expunge(user)
+    token_cache.set(token, user, ttl=ttl, tags=[("user", user.id)])
+    return db.session.merge(user, load=False)
 
 
 def auth_required(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         token = request.headers.get("x-access-token", None)
-        secret = os.environ.get("SESSION_SECRET")
         if token:
             try:
-                payload = jwt.decode(token, secret, algorithms=["HS256"])
-                user_id = payload["id"]
-                if user_id:
-                    g.user = User.query.filter(User.id == user_id).one()
+                user = user_from_token(token)
+                if user is not None:
+                    g.user = user
                     return func(*args, **kwargs)
 
             except NoResultFound:
@@ -0,0 +1,192 @@
+import threading
+
+from sqlalchemy import select
+
+import metrics
+from cache import LRUCache
+from db.shared import db
+
+# normalized GET /api/posts query -> (JSON body bytes, status code, ETag, {content coding: compressed body}).
+# Entries are tagged ("author", id)
+# for every requested author, so a write to one post drops exactly the pages that could contain it.
+posts_cache = LRUCache()
+metrics.register("postsResponseCache", posts_cache.stats)
+
+# (post id, post version, variant) -> the post's JSON encoded object, see fragment_key. Entries are tagged
+# ("post", id). A write bumps the post's version, so stale fragments are never looked up again.
+post_fragments = LRUCache()
+metrics.register("postFragmentCache", post_fragments.stats)
+
+# (author ids, limit) -> [(tag name, post count)] of GET /api/tags for several authors, which is counted
+# from the posts rather than read from counters, see TagCount.facets. Tagged ("author", id) like posts_cache.
+tag_facets_cache = LRUCache()
+metrics.register("tagFacetsCache", tag_facets_cache.stats)
+
+# post ids looked up per query when mapping written posts to their authors.
+AUTHOR_LOOKUP_CHUNK_SIZE = 500
+
+# bumped by every invalidation. A response computed while an invalidation happened may be stale and is not
+# stored, see store.
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def init_app(app):
+    """
+    sizes the posts response, post fragment and tag facets caches from app config. POSTS_CACHE_ENABLED,
+    POST_FRAGMENT_CACHE_ENABLED and TAG_FACETS_CACHE_ENABLED turn them off entirely.
+    """
+    posts_cache.maxsize = app.config["POSTS_CACHE_SIZE"]
+    posts_cache.maxbytes = app.config["POSTS_CACHE_MAX_BYTES"]
+    posts_cache.ttl = app.config["POSTS_CACHE_TTL"]
+    posts_cache.clear()
+    posts_cache.reset_stats()
+
+    post_fragments.maxsize = app.config["POST_FRAGMENT_CACHE_SIZE"]
+    post_fragments.maxbytes = app.config["POST_FRAGMENT_CACHE_MAX_BYTES"]
+    post_fragments.clear()
+    post_fragments.reset_stats()
+
+    tag_facets_cache.maxsize = app.config["TAG_FACETS_CACHE_SIZE"]
+    tag_facets_cache.ttl = app.config["POSTS_CACHE_TTL"]
+    tag_facets_cache.clear()
+    tag_facets_cache.reset_stats()
+
+
+def posts_key(
+    author_ids,
+    sort_by,
+    direction,
+    limit,
+    cursor,
+    tags,
+    tag_mode,
+    fields=None,
+    include=(),
+):
+    """
+    Returns the cache key of a GET /api/posts query. Author ids, tags, fields and includes are sorted
+    and de-duplicated, so equivalent queries share one entry.
+    """
+    return (
+        tuple(sorted(set(author_ids))),
+        sort_by,
+        direction,
+        limit,
+        cursor,
+        tuple(sorted(set(tags))) if tags else None,
+        tag_mode if tags else None,
+        tuple(sorted(set(fields))) if fields is not None else None,
+        tuple(sorted(set(include))),
+    )
+
+
+def fragment_key(post_id, version, fields, include):
+    """returns the post_fragments key of one post serialized with the given fields and includes"""
+    return (
+        post_id,
+        version,
+        tuple(fields) if fields is not None else None,
+        tuple(sorted(include)),
+    )
+
+
+def store_fragment(key, fragment):
+    post_fragments.set(key, fragment, tags=[("post", key[0])], size=len(fragment))
+
+
+def invalidate_post_fragments(post_ids):
+    """drops the cached fragments of the posts"""
+    for post_id in set(post_ids):
+        post_fragments.invalidate_tag(("post", post_id))
+
+
+def facets_key(author_ids, limit):
+    """returns the tag_facets_cache key of GET /api/tags for the authors"""
+    return tuple(sorted(set(author_ids))), limit
+
+
+def store_facets(key, facets, started_generation):
+    """caches the tag facets of key's authors unless an invalidation happened since started_generation"""
+    with _generation_lock:
+        if started_generation != _generation:
+            return
+        tag_facets_cache.set(
+            key, facets, tags=[("author", author_id) for author_id in key[0]]
+        )
+
+
+def generation():
+    """returns the invalidation generation to pass to store once the response is built"""
+    return _generation
+
+
+def store(key, author_ids, body, status, etag, started_generation, variants=None):
+    """
+    caches a response unless an invalidation happened since started_generation was read. Storing a key
+    again replaces its entry, e.g. to add a compressed variant.
+    :param etag: the ETag the response was built under. Writers commit before they invalidate, so readers
+        must only serve an entry whose ETag matches the current one.
+    :param variants: optional {content coding: compressed body} of the response, see compression.
+    """
+    variants = variants or {}
+    with _generation_lock:
+        if started_generation != _generation:
+            return
+        posts_cache.set(
+            key,
+            (body, status, etag, variants),
+            tags=[("author", author_id) for author_id in set(author_ids)],
+            size=len(body) + sum(len(data) for data in variants.values()),
+        )
+
+
+def invalidate_authors(author_ids, facets=True):
+    """
+    drops every cached response that includes any of the authors.
+    :param facets: False keeps their tag facets, for writes that cannot change tags or authors.
+    """
+    _bump_generation()
+    for author_id in set(author_ids):
+        posts_cache.invalidate_tag(("author", author_id))
+        if facets:
+            tag_facets_cache.invalidate_tag(("author", author_id))
+
+
+def invalidate_posts(post_ids):
+    """
+    drops every cached response that includes an author of any of the posts, and the posts' fragments.
+    Used for like and read counts, which leave tag facets as they are. Needs an app context.
+    """
+    from db.models.user_post import UserPost
+
+    post_ids = list(post_ids)
+    invalidate_post_fragments(post_ids)
+    author_ids = set()
+    for start in range(0, len(post_ids), AUTHOR_LOOKUP_CHUNK_SIZE):
+        author_ids.update(
+            db.session.execute(
+                select(UserPost.user_id)
+                .where(
+                    UserPost.post_id.in_(
+                        post_ids[start : start + AUTHOR_LOOKUP_CHUNK_SIZE]
+                    )
+                )
+                .distinct()
+            ).scalars()
+        )
+    invalidate_authors(author_ids, facets=False)
+
+
+def clear():
+    """drops every cached response, for writes that touch too many posts to invalidate one by one"""
+    _bump_generation()
+    posts_cache.clear()
+    post_fragments.clear()
+    tag_facets_cache.clear()
+
+
+def _bump_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
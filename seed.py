@@ -5,6 +5,9 @@ from db.shared import db
 from db.models.user_post import UserPost
 from db.models.post import Post
 from db.models.user import User
+from db.models.role import Role
+from db.models.tag import PostTag, Tag
+from db.models.tag_count import AuthorTagCount, TagCount
 
 SEED_PASSWORD = "123456"
 
@@ -21,9 +24,14 @@ def create_app():
 
 def reset(db):
     try:
+        TagCount.__table__.drop(db.engine, checkfirst=True)
+        AuthorTagCount.__table__.drop(db.engine, checkfirst=True)
+        PostTag.__table__.drop(db.engine, checkfirst=True)
         UserPost.__table__.drop(db.engine)
         User.__table__.drop(db.engine)
         Post.__table__.drop(db.engine)
+        Role.__table__.drop(db.engine)
+        Tag.__table__.drop(db.engine, checkfirst=True)
     except:
         pass
     db.create_all()
@@ -31,6 +39,9 @@ def reset(db):
 
 
 def seed(db):
+    db.session.add_all(Role.defaults())
+    db.session.commit()
+
     thomas = User(username="thomas", password=SEED_PASSWORD)
     db.session.add(thomas)
     db.session.commit()
@@ -109,6 +120,9 @@ def seed(db):
     db.session.add(cheng)
     db.session.commit()
 
+    TagCount.rebuild()
+    db.session.commit()
+
     print("seeded users and posts")
 
 
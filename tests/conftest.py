@@ -1,5 +1,10 @@
+import os
+
 import pytest
 
+# every test reseeds database.db, so an outdated checked-in copy must not stop the app from loading.
+os.environ["SCHEMA_CHECK_ENABLED"] = "false"
+
 from db.shared import db
 from app import create_app
 import seed
@@ -1,5 +1,11 @@
 import json
 
+from db.passwords import HashPoolFull, hasher
+from db.shared import db
+from db.models.user import User
+from middlewares import token_cache
+from tests.utils import make_token
+
 
 def test_login(client):
     """should allow login request from thomas."""
@@ -12,3 +18,150 @@ def test_login(client):
     assert values.get("username") == "thomas"
     assert values.get("id") == 1
     assert response.status_code == 200
+
+
+def test_token_cache_skips_user_query(client):
+    """should serve repeated requests with one token from the token cache."""
+    token = make_token(2)
+    for _ in range(3):
+        response = client.get(
+            "/api/posts",
+            headers={"x-access-token": token},
+            query_string={"authorIds": "2"},
+        )
+        assert response.status_code == 200
+
+    assert token_cache.stats()["misses"] == 1
+    assert token_cache.stats()["hits"] == 2
+
+
+def test_token_cache_invalidated_on_user_update(client):
+    """should drop cached tokens of a user when that user is updated."""
+    token = make_token(2)
+    client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string={"authorIds": "2"}
+    )
+    assert len(token_cache) == 1
+
+    with client.application.app_context():
+        user = User.query.get(2)
+        user.username = "santiago2"
+        db.session.commit()
+
+    assert len(token_cache) == 0
+
+
+def test_token_cache_disabled(client):
+    """should not cache tokens when AUTH_CACHE_ENABLED is off."""
+    client.application.config["AUTH_CACHE_ENABLED"] = False
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(2)},
+        query_string={"authorIds": "2"},
+    )
+
+    assert response.status_code == 200
+    assert len(token_cache) == 0
+
+
+def test_register_when_hash_pool_full(client):
+    """should return 503 instead of queueing more password hashing work."""
+    for _ in range(hasher.max_queue):
+        hasher._slots.acquire()
+    try:
+        response = client.post(
+            "/api/register",
+            data=json.dumps(dict(username="newuser", password="123456")),
+            content_type="application/json",
+        )
+    finally:
+        for _ in range(hasher.max_queue):
+            hasher._slots.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_metrics_report_hashing_times(client):
+    """should report queue wait and hash time of the password hashing pool separately."""
+    client.post(
+        "/api/login",
+        data=json.dumps(dict(username="thomas", password="123456")),
+        content_type="application/json",
+    )
+    response = client.get("/api/metrics", headers={"x-access-token": make_token(1)})
+    hashing = response.json["passwordHashing"]
+
+    assert response.status_code == 200
+    assert hashing["hashTime"]["count"] == hashing["queueWait"]["count"] > 0
+    assert "authCache" in response.json
+
+
+def test_login_survives_dead_hash_worker(client):
+    """should replace a hashing pool broken by a dead worker instead of failing every later login."""
+    pool = hasher._pool()
+    hasher.checkpw(b"123456", hasher.hashpw(b"123456", hasher.gensalt()))
+    restarts = hasher.pool_restarts
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+
+    response = client.post(
+        "/api/login",
+        data=json.dumps(dict(username="thomas", password="123456")),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    assert hasher.pool_restarts == restarts + 1
+
+
+def test_update_keeps_password_hash(client):
+    """should not re-hash the password when other columns of a user change."""
+    with client.application.app_context():
+        user = User.query.get(1)
+        password_hash = user.password
+        user.username = "thomas2"
+        db.session.commit()
+
+        assert User.query.get(1).password == password_hash
+        assert User.query.get(1).correct_password("123456")
+
+
+def test_login_rehashes_with_higher_cost(client):
+    """should transparently upgrade the stored hash when BCRYPT_ROUNDS was raised."""
+    rounds = hasher.rounds
+    hasher.rounds = rounds + 1
+    try:
+        response = client.post(
+            "/api/login",
+            data=json.dumps(dict(username="thomas", password="123456")),
+            content_type="application/json",
+        )
+        with client.application.app_context():
+            user = User.query.get(1)
+            assert not user.needs_rehash()
+            assert user.correct_password("123456")
+    finally:
+        hasher.rounds = rounds
+
+    assert response.status_code == 200
+
+
+def test_login_skips_rehash_when_pool_is_full(client, monkeypatch):
+    """should still log in with the old hash when the hashing pool has no room for the upgrade."""
+
+    def pool_full(password, salt):
+        raise HashPoolFull("Too many password hashing requests are queued")
+
+    monkeypatch.setattr(hasher, "hashpw", pool_full)
+    monkeypatch.setattr(hasher, "rounds", hasher.rounds + 1)
+    response = client.post(
+        "/api/login",
+        data=json.dumps(dict(username="thomas", password="123456")),
+        content_type="application/json",
+    )
+
+    assert response.status_code == 200
+    with client.application.app_context():
+        assert User.query.get(1).needs_rehash()
@@ -0,0 +1,53 @@
+import gzip
+
+import response_cache
+from response_cache import posts_cache
+from tests.utils import make_token
+
+
+def get_posts(client, headers=None, **query_string):
+    return client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1), **(headers or {})},
+        query_string=query_string,
+    )
+
+
+def test_gzip_negotiated(client):
+    """should gzip large responses for clients accepting it and leave the others alone."""
+
+    plain = get_posts(client, authorIds="2")
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+    compressed = get_posts(
+        client, {"Accept-Encoding": "deflate, gzip;q=0.8"}, authorIds="2"
+    )
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["ETag"] == "W/" + plain.headers["ETag"]
+
+    response = get_posts(
+        client,
+        {"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]},
+        authorIds="2",
+    )
+    assert response.status_code == 304
+
+    app = client.application
+    app.config["COMPRESSION_MIN_SIZE"] = len(plain.data) + 1
+    response = get_posts(client, {"Accept-Encoding": "gzip"}, authorIds="2", limit=1)
+    assert "Content-Encoding" not in response.headers
+
+
+def test_compressed_variant_cached(client):
+    """should store the compressed body with the cached response and reuse it on later hits."""
+
+    get_posts(client, {"Accept-Encoding": "gzip"}, authorIds="2")
+    key = response_cache.posts_key([2], "id", "asc", None, None, None, "any")
+    body, status, etag, variants = posts_cache.get(key)
+    assert list(variants) == ["gzip"]
+
+    response = get_posts(client, {"Accept-Encoding": "gzip"}, authorIds="2")
+    assert response.data == variants["gzip"]
+    assert gzip.decompress(response.data) == body
@@ -0,0 +1,71 @@
+import time
+
+from db.counters import counters
+from db.models.post import Post
+from tests.utils import make_token
+
+
+def hit(client, post_id, counter, times=1):
+    for _ in range(times):
+        response = client.post(
+            f"/api/posts/{post_id}/{counter}",
+            headers={"x-access-token": make_token(1)},
+        )
+        assert response.status_code == 202
+
+
+def counts(client, post_id):
+    with client.application.app_context():
+        post = Post.query.get(post_id)
+        return post.likes, post.reads
+
+
+def test_counters_are_buffered_until_flush(client):
+    """should add buffered likes and reads to the stored counts in one flush."""
+    app = client.application
+    app.config["COUNTER_FLUSH_INTERVAL"] = 60
+    counters.init_app(app)
+
+    hit(client, 1, "like", 3)
+    hit(client, 1, "read", 2)
+    hit(client, 2, "read")
+
+    assert counts(client, 1) == (12, 5)
+    assert counters.stats()["pendingDelta"] == 6
+    assert counters.flush() == 2
+    assert counts(client, 1) == (15, 7)
+    assert counts(client, 2) == (104, 201)
+    assert counters.stats()["pendingDelta"] == 0
+
+
+def test_counters_flush_at_max_delta(client):
+    """should wake the flush thread once a request reaches COUNTER_MAX_DELTA."""
+    app = client.application
+    app.config["COUNTER_FLUSH_INTERVAL"] = 60
+    app.config["COUNTER_MAX_DELTA"] = 3
+    counters.init_app(app)
+
+    hit(client, 1, "like", 2)
+    assert counts(client, 1) == (12, 5)
+    flushes = counters.stats()["flushes"]
+    hit(client, 1, "like")
+    deadline = time.monotonic() + 5
+    while counts(client, 1) != (15, 5) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert counts(client, 1) == (15, 5)
+    assert counters.stats()["flushes"] == flushes + 1
+
+
+def test_counters_unbuffered(client):
+    """should write every increment immediately when the buffer is disabled."""
+    app = client.application
+    app.config["COUNTER_BUFFER_ENABLED"] = False
+    counters.init_app(app)
+
+    hit(client, 3, "like")
+    assert counts(client, 3) == (11, 32)
+
+    response = client.post(
+        "/api/posts/99/like", headers={"x-access-token": make_token(1)}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import json_encoding
+import metrics
+from tests.utils import make_token
+
+
+def test_orjson_matches_stdlib(client):
+    """should return byte for byte the same responses with either encoder."""
+
+    pytest.importorskip("orjson")
+    app = client.application
+    token = make_token(2)
+    query_string = {"authorIds": "1,2,3", "include": "authors,authorNames"}
+    app.config["POSTS_CACHE_ENABLED"] = False
+    app.config["POST_FRAGMENT_CACHE_ENABLED"] = False
+    # compact output, as outside of debug mode. Indented output always uses the stdlib encoder.
+    app.debug = False
+
+    bodies = {}
+    for encoder in ["stdlib", "orjson"]:
+        app.config["JSON_ENCODER"] = encoder
+        json_encoding.init_app(app)
+        bodies[encoder] = client.get(
+            "/api/posts", headers={"x-access-token": token}, query_string=query_string
+        ).data
+    assert bodies["orjson"] == bodies["stdlib"]
+    assert metrics.snapshot()["jsonEncoder"]["fastEncodes"] > 0
+
+    values = {"b": [0.19, 1e-05, 1e16, 2**70], "a": 'é😀\x7f\x00"\\'}
+    with app.app_context():
+        for ensure_ascii in [True, False]:
+            encoded = [
+                json.dumps(
+                    values,
+                    cls=cls,
+                    separators=(",", ":"),
+                    ensure_ascii=ensure_ascii,
+                    sort_keys=True,
+                )
+                for cls in [json_encoding.OrjsonEncoder, json_encoding.JSONEncoder]
+            ]
+            assert encoded[0] == encoded[1]
+
+    # words that look like exponents stay on the fast path, floats orjson formats differently do not.
+    stats = metrics.snapshot()["jsonEncoder"]
+    encoder = json_encoding.OrjsonEncoder(separators=(",", ":"))
+    encoder.encode({"text": "a three-day stay, e-mail 3e-5", "popularity": 0.19})
+    assert metrics.snapshot()["jsonEncoder"]["fastEncodes"] == stats["fastEncodes"] + 1
+    assert encoder.encode([1e-05, 1e16]) == "[1e-05,1e+16]"
+    assert metrics.snapshot()["jsonEncoder"]["fallbacks"] == stats["fallbacks"] + 1
+
+    app.config["JSON_ENCODER"] = "ujson"
+    with pytest.raises(RuntimeError):
+        json_encoding.init_app(app)
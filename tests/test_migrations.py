@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from db.shared import db
+from db.models.post import Post
+from db.migrations import SchemaOutdated, upgrade, check_query_plans
+
+
+def test_upgrade_creates_missing_indexes(client):
+    """should recreate dropped indexes on an existing database and be idempotent."""
+
+    with client.application.app_context():
+        db.session.execute(text("DROP INDEX ix_post_reads_id"))
+        db.session.execute(text("DROP INDEX ix_user_post_post_id_user_id"))
+        db.session.commit()
+
+        assert sorted(upgrade(db)) == [
+            "index ix_post_reads_id",
+            "index ix_user_post_post_id_user_id",
+        ]
+        assert upgrade(db) == []
+
+        index_names = {
+            index["name"] for index in inspect(db.engine).get_indexes("post")
+        }
+        assert "ix_post_reads_id" in index_names
+
+
+def test_outdated_schema_refused_at_startup(client, monkeypatch):
+    """should refuse to create the app on a database lacking a model column, naming flask upgrade-db."""
+
+    with client.application.app_context():
+        db.session.execute(text("ALTER TABLE user DROP COLUMN posts_version"))
+        db.session.commit()
+
+    from app import create_app
+
+    monkeypatch.setenv("SCHEMA_CHECK_ENABLED", "true")
+    monkeypatch.setenv("DB_PATH", "sqlite:///database.db")
+    with pytest.raises(
+        SchemaOutdated, match="column user.posts_version.*flask upgrade-db"
+    ):
+        create_app()
+
+    with client.application.app_context():
+        upgrade(db)
+    create_app()
+
+
+def test_hot_queries_use_indexes(client):
+    """should use the expected index, without a full scan or avoidable sort, in every hot query."""
+
+    with client.application.app_context():
+        for description, plan, problems in check_query_plans(db):
+            assert problems == [], f"{description}: {plan}"
+
+
+def test_query_plan_check_flags_missing_sort_index(client):
+    """should report the sort a dropped (sort_by, id) index leaves behind."""
+
+    with client.application.app_context():
+        db.session.execute(text("DROP INDEX ix_post_reads_id"))
+        db.session.commit()
+
+        problems = {
+            description: problems for description, _, problems in check_query_plans(db)
+        }
+        assert problems["posts by authors sorted by reads"] == [
+            "full scan: SCAN post",
+            "does not use ix_post_reads_id",
+            "sorts instead of reading ix_post_reads_id in order",
+        ]
+        assert problems["posts by authors sorted by likes"] == []
+
+
+def test_upgrade_rebuilds_post_in_column_order(client):
+    """should rebuild a post table whose added columns follow text, keeping rows, indexes and search."""
+
+    with client.application.app_context():
+        db.session.execute(text("ALTER TABLE post DROP COLUMN version"))
+        db.session.commit()
+
+        assert upgrade(db) == ["column post.version", "post table in column order"]
+        assert upgrade(db) == []
+
+        columns = [column["name"] for column in inspect(db.engine).get_columns("post")]
+        assert columns == [column.name for column in Post.__table__.columns]
+        index_names = {
+            index["name"] for index in inspect(db.engine).get_indexes("post")
+        }
+        assert {index.name for index in Post.__table__.indexes} <= index_names
+
+        db.session.expire_all()
+        post = Post.query.get(2)
+        assert (post.likes, post.reads, post.tags) == (104, 200, ["travel", "hotels"])
+        assert [user.id for user in post.users] == [2]
+        post.text = "a quiet lighthouse"
+        db.session.commit()
+        assert [post.id for post in Post.search("lighthouse")] == [2]
+
+
+def test_upgrade_moves_tags_column(client):
+    """should move a legacy comma separated tags column into post_tag and drop it."""
+
+    with client.application.app_context():
+        db.session.execute(text("DELETE FROM post_tag"))
+        db.session.execute(
+            text("ALTER TABLE post ADD COLUMN tags VARCHAR NOT NULL DEFAULT ''")
+        )
+        db.session.execute(text("UPDATE post SET tags = 'b,a' WHERE id = 1"))
+        db.session.execute(text("UPDATE post SET tags = 'a' WHERE id = 2"))
+        db.session.commit()
+
+        assert upgrade(db) == ["post_tag rows for 4 posts"]
+        assert upgrade(db) == []
+
+        db.session.expire_all()
+        assert Post.query.get(1).tags == ["b", "a"]
+        assert Post.query.get(2).tags == ["a"]
+        assert Post.query.get(3).tags == []
+        columns = {column["name"] for column in inspect(db.engine).get_columns("post")}
+        assert "tags" not in columns
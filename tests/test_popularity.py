@@ -0,0 +1,23 @@
+import math
+
+from db.models.post import Post
+from db.popularity import popularity
+
+
+def test_recompute_popularity(client):
+    """should score every post from its likes and reads, chunk by chunk, and skip unchanged scores."""
+    app = client.application
+    app.config["POPULARITY_CHUNK_SIZE"] = 3
+    popularity.init_app(app)
+
+    with app.app_context():
+        assert popularity.recompute()["posts"] == 4
+
+        for post in Post.query.all():
+            expected = 0.7 * math.log1p(post.likes) / math.log1p(
+                104
+            ) + 0.3 * math.log1p(post.reads) / math.log1p(300)
+            assert math.isclose(post.popularity, expected)
+            assert 0.0 <= post.popularity <= 1.0
+
+        assert popularity.recompute()["updated"] == 0
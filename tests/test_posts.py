@@ -1,4 +1,10 @@
+import base64
 import json
+from sqlalchemy import event
+from db.shared import db
+from db.models.post import Post
+from db.models.user import User
+from db.models.user_post import UserPost
 from tests.utils import make_token
 
 
@@ -58,6 +64,345 @@ def test_update_text_property(client):
     )
 
 
+def test_get_posts_shared_authors_sorted_desc(client):
+    """should de-duplicate shared posts and break sort ties by id in the same direction."""
+
+    token = make_token(1)
+    query_params = {"authorIds": "1,2,1", "sortBy": "popularity", "direction": "desc"}
+    response = client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string=query_params
+    )
+
+    assert [post["id"] for post in response.json["posts"]] == [3, 2, 1]
+
+
+def test_get_posts_paginated(client):
+    """should return the same posts page by page for every sort and direction."""
+
+    token = make_token(1)
+    for sort_by in ["id", "reads", "likes", "popularity"]:
+        for direction in ["asc", "desc"]:
+            query_params = {
+                "authorIds": "2,3",
+                "sortBy": sort_by,
+                "direction": direction,
+            }
+            unpaginated = client.get(
+                "/api/posts",
+                headers={"x-access-token": token},
+                query_string=query_params,
+            ).json["posts"]
+
+            paginated = []
+            query_params["limit"] = 1
+            while True:
+                response = client.get(
+                    "/api/posts",
+                    headers={"x-access-token": token},
+                    query_string=query_params,
+                )
+                assert response.status_code == 200
+                assert len(response.json["posts"]) <= 1
+                paginated.extend(response.json["posts"])
+                if response.json["nextCursor"] is None:
+                    break
+                query_params["cursor"] = response.json["nextCursor"]
+
+            assert paginated == unpaginated
+
+
+def test_get_posts_cursor_for_other_sort(client):
+    """should reject a cursor issued for a different sort."""
+
+    token = make_token(1)
+    query_params = {"authorIds": "2", "sortBy": "reads", "limit": 1}
+    response = client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string=query_params
+    )
+    query_params["cursor"] = response.json["nextCursor"]
+    query_params["sortBy"] = "likes"
+    response = client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string=query_params
+    )
+
+    assert response.status_code == 400
+
+
+def test_get_posts_cursor_rejects_booleans(client):
+    """should reject a cursor holding true or false in place of the sort value or id."""
+
+    token = make_token(1)
+    for payload in (["likes", "asc", True, False], ["likes", "asc", 10, True]):
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        cursor = base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+        response = client.get(
+            "/api/posts",
+            headers={"x-access-token": token},
+            query_string={"authorIds": "2", "sortBy": "likes", "cursor": cursor},
+        )
+
+        assert response.status_code == 400
+
+
+def test_update_authors_reports_all_missing_ids(client):
+    """should report every author id that does not exist in one error."""
+
+    response = client.patch(
+        "/api/posts/1",
+        headers={"x-access-token": make_token(1), "Content-Type": "application/json"},
+        data=json.dumps({"authorIds": [1, 98, 2, 99]}),
+    )
+
+    assert response.status_code == 400
+    assert response.json == {
+        "error": "The users referenced by ids (98, 99) do not exist. Cannot add as authors."
+    }
+
+
+def test_author_ids_reject_booleans(client):
+    """should answer 400, not 500, when authorIds contains true or false."""
+
+    response = client.patch(
+        "/api/posts/1",
+        headers={"x-access-token": make_token(2)},
+        json={"authorIds": [2, True]},
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/api/posts/bulk",
+        headers={"x-access-token": make_token(1)},
+        data=json.dumps([{"text": "ok", "authorIds": [False]}]),
+    )
+    assert response.status_code == 400
+
+
+def test_update_authors_writes_only_changes(client):
+    """should keep unchanged user_post rows and only insert and delete the difference."""
+
+    with client.application.app_context():
+        added, removed = UserPost.set_post_authors(1, [2, 3])
+        db.session.commit()
+
+        assert (added, removed) == ({3}, {1})
+        assert sorted(row.user_id for row in UserPost.query.filter_by(post_id=1)) == [
+            2,
+            3,
+        ]
+
+
+def test_is_author_without_loading_posts(client):
+    """should answer authorship with an existence check and expose dynamic relationships."""
+
+    with client.application.test_request_context():
+        user = User.query.get(2)
+        post = Post.query.get(1)
+
+        assert user.isAuthor(post)
+        assert not User.query.get(3).isAuthor(post)
+        assert "posts" not in user.__dict__  # the posts collection was never loaded
+        assert [p.id for p in user.posts_query.filter(Post.reads > 100)] == [2]
+        assert [u.id for u in post.users_query.order_by(User.id)] == [1, 2]
+
+
+def test_create_post_single_commit(client):
+    """should create a post owned by its author."""
+
+    response = client.post(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        data=json.dumps({"text": "new post", "tags": ["a"]}),
+    )
+
+    assert response.status_code == 200
+    assert response.json["tags"] == ["a"]
+    with client.application.app_context():
+        assert UserPost.query.filter_by(post_id=response.json["id"]).one().user_id == 1
+
+
+def test_bulk_create_posts(client):
+    """should create every post with its co-authors and return the ids in order."""
+
+    data = [
+        {"text": f"bulk post {i}", "tags": ["bulk", str(i)], "authorIds": [1, 3]}
+        for i in range(10000)
+    ]
+    response = client.post(
+        "/api/posts/bulk",
+        headers={"x-access-token": make_token(1)},
+        data=json.dumps(data),
+    )
+
+    assert response.status_code == 200
+    ids = response.json["ids"]
+    assert ids == list(range(5, 10005))
+    with client.application.app_context():
+        post = Post.query.get(ids[42])
+        assert post.text == "bulk post 42"
+        assert post.tags == ["bulk", "42"]
+        assert [
+            (u.user_id, u.role_id) for u in UserPost.query.filter_by(post_id=ids[42])
+        ] == [
+            (1, 1),
+            (3, 1),
+        ]
+
+
+def test_bulk_create_posts_unknown_author(client):
+    """should reject the whole array when any co-author does not exist."""
+
+    data = [{"text": "ok"}, {"text": "bad", "authorIds": [99]}]
+    response = client.post(
+        "/api/posts/bulk",
+        headers={"x-access-token": make_token(1)},
+        data=json.dumps(data),
+    )
+
+    assert response.status_code == 400
+    with client.application.app_context():
+        assert Post.query.count() == 4
+
+
+def test_get_posts_by_tags(client):
+    """should return the posts with any or all of the given tags."""
+
+    token = make_token(2)
+    ids = {}
+    for tag_mode in ["any", "all"]:
+        response = client.get(
+            "/api/posts",
+            headers={"x-access-token": token},
+            query_string={
+                "authorIds": "2",
+                "tags": "travel,vacation",
+                "tagMode": tag_mode,
+            },
+        )
+        assert response.status_code == 200
+        ids[tag_mode] = [post["id"] for post in response.json["posts"]]
+
+    assert ids == {"any": [2, 3], "all": [3]}
+    assert response.json["posts"][0]["tags"] == ["travel", "airbnb", "vacation"]
+
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token},
+        query_string={"authorIds": "2", "tags": "travel", "tagMode": "some"},
+    )
+    assert response.status_code == 400
+
+
+def test_get_posts_fields(client):
+    """should return only the requested fields and leave unrequested columns out of the query."""
+
+    token = make_token(2)
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token},
+        query_string={"authorIds": "2", "sortBy": "likes", "fields": "likes,id"},
+    )
+    assert response.status_code == 200
+    assert response.json["posts"] == [
+        {"id": 3, "likes": 10},
+        {"id": 1, "likes": 12},
+        {"id": 2, "likes": 104},
+    ]
+
+    with client.application.app_context():
+        query = str(Post.posts_by_user_ids_query([2], "reads", fields=["id"]))
+    assert "post.text" not in query
+    assert "post.reads" in query
+
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token},
+        query_string={"authorIds": "2", "fields": "id,body"},
+    )
+    assert response.status_code == 400
+
+
+def test_get_posts_include_authors(client):
+    """should embed every post's authors, loaded with one query for the whole page."""
+
+    token = make_token(2)
+    statements = []
+
+    def count(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with client.application.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        response = client.get(
+            "/api/posts",
+            headers={"x-access-token": token},
+            query_string={
+                "authorIds": "2,3",
+                "fields": "id",
+                "include": "authors,authorNames",
+            },
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200
+    assert response.json["posts"] == [
+        {"id": 1, "authorIds": [1, 2], "authorNames": ["thomas", "santiago"]},
+        {"id": 2, "authorIds": [2], "authorNames": ["santiago"]},
+        {"id": 3, "authorIds": [2, 3], "authorNames": ["santiago", "ashanti"]},
+        {"id": 4, "authorIds": [3], "authorNames": ["ashanti"]},
+    ]
+    # the page itself and one select-in query for the authors of all four posts.
+    assert len([s for s in statements if "user_post" in s]) == 2
+
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token},
+        query_string={"authorIds": "2", "include": "editors"},
+    )
+    assert response.status_code == 400
+
+
+def test_get_posts_conditional(client):
+    """should answer an unchanged feed with 304 and change the ETag when an author's post changes."""
+
+    token = make_token(2)
+    response = client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string={"authorIds": "2"}
+    )
+    etag = response.headers["ETag"]
+    other = client.get(
+        "/api/posts", headers={"x-access-token": token}, query_string={"authorIds": "3"}
+    ).headers["ETag"]
+
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token, "If-None-Match": etag},
+        query_string={"authorIds": "2"},
+    )
+    assert response.status_code == 304
+    assert response.data == b""
+
+    client.patch(
+        "/api/posts/1", headers={"x-access-token": token}, json={"text": "new"}
+    )
+
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token, "If-None-Match": etag},
+        query_string={"authorIds": "2"},
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": token, "If-None-Match": other},
+        query_string={"authorIds": "3"},
+    )
+    assert response.status_code == 304
+
+
 # mock data
 posts_of_user_2 = {
     "posts": [
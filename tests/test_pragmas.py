@@ -0,0 +1,56 @@
+import logging
+
+from sqlalchemy import create_engine
+
+from app import create_app
+from db import pragmas
+from db.shared import db
+from db.pragmas import PROFILES, effective_pragmas
+
+
+def test_sample_database_keeps_sqlite_defaults(client):
+    """should not switch the checked-in database.db to WAL or apply any other pragma."""
+    with client.application.app_context():
+        effective = effective_pragmas(db.session.connection())
+
+    assert client.application.config["SQLITE_PROFILE"] == "sqlite-defaults"
+    assert client.application.config["SQLITE_PRAGMAS"] == {}
+    assert effective["journal_mode"] != "wal"
+
+
+def test_production_pragmas_applied(client, monkeypatch, tmp_path):
+    """should apply the production tuning profile to every connection of the app's own engine only."""
+    monkeypatch.setenv("DB_PATH", f"sqlite:///{tmp_path / 'production.db'}")
+    app = create_app()
+    with app.app_context():
+        effective = effective_pragmas(db.session.connection())
+    other = create_engine(f"sqlite:///{tmp_path / 'other.db'}")
+    with other.connect() as connection:
+        untouched = effective_pragmas(connection)
+    other.dispose()
+
+    assert app.config["SQLITE_PROFILE"] == "production"
+    assert effective["journal_mode"] == "wal"
+    assert effective["synchronous"] == 1  # NORMAL
+    assert effective["cache_size"] == PROFILES["production"]["cache_size"]
+    assert effective["busy_timeout"] == PROFILES["production"]["busy_timeout"]
+    assert effective["temp_store"] == 2  # MEMORY
+    assert untouched["journal_mode"] == "delete"
+    assert untouched["cache_size"] == -2000  # SQLite's default
+
+
+def test_effective_pragmas_logged_outside_debug(client, caplog):
+    """should log the effective pragmas even when the app logger has no level of its own."""
+    app = client.application
+    level = app.logger.level
+    app.logger.setLevel(logging.NOTSET)  # as outside debug mode
+    try:
+        pragmas.init_app(app, db)
+    finally:
+        app.logger.setLevel(level)
+
+    assert any(
+        record.levelno == logging.INFO
+        and record.getMessage().startswith("SQLite profile sqlite-defaults")
+        for record in caplog.records
+    )
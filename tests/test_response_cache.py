@@ -0,0 +1,132 @@
+from db.counters import counters
+from db.models.post import Post
+from db.writes import writes
+import response_cache
+from response_cache import post_fragments, posts_cache
+from tests.utils import make_token
+
+
+def get_posts(client, **query_string):
+    response = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        query_string=query_string,
+    )
+    assert response.status_code == 200
+    return response.json
+
+
+def test_posts_cache_hits_normalized_queries(client):
+    """should serve equivalent author lists from one cache entry."""
+
+    first = get_posts(client, authorIds="2,1", sortBy="likes")
+    second = get_posts(client, authorIds="1,2,2", sortBy="likes")
+
+    assert first == second
+    assert posts_cache.stats()["misses"] == 1
+    assert posts_cache.stats()["hits"] == 1
+    assert posts_cache.stats()["bytes"] > 0
+
+
+def test_posts_cache_invalidated_by_writes(client):
+    """should drop the cached pages of a post's authors when it changes."""
+
+    get_posts(client, authorIds="2")
+    get_posts(client, authorIds="3")
+    response = client.patch(
+        "/api/posts/1",
+        headers={"x-access-token": make_token(2)},
+        json={"text": "changed"},
+    )
+    assert response.status_code == 200
+    assert len(posts_cache) == 1
+
+    assert get_posts(client, authorIds="2")["posts"][0]["text"] == "changed"
+
+    app = client.application
+    app.config["COUNTER_FLUSH_INTERVAL"] = 60
+    counters.init_app(app)
+    client.post("/api/posts/2/like", headers={"x-access-token": make_token(1)})
+    counters.flush()
+    assert get_posts(client, authorIds="2")["posts"][1]["likes"] == 105
+
+
+def test_posts_cache_checks_etag(client):
+    """should not serve an entry built before a write that has committed but not invalidated yet."""
+
+    first = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        query_string={"authorIds": "2"},
+    )
+
+    # the window between a writer's commit and its invalidation.
+    with client.application.app_context():
+        writes.submit(Post.apply_update, 1, None, None, None, "committed")
+
+    second = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        query_string={"authorIds": "2"},
+    )
+    assert second.json["posts"][0]["text"] == "committed"
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+
+def test_posts_cache_byte_cap(client):
+    """should evict least recently used responses beyond POSTS_CACHE_MAX_BYTES."""
+    get_posts(client, authorIds="1")
+    # room for one and a half responses, whether or not they are indented in debug mode.
+    maxbytes = posts_cache.stats()["bytes"] * 3 // 2
+    app = client.application
+    app.config["POSTS_CACHE_MAX_BYTES"] = maxbytes
+    response_cache.init_app(app)
+
+    get_posts(client, authorIds="1")
+    get_posts(client, authorIds="1", sortBy="likes")
+
+    assert posts_cache.stats()["evictions"] == 1
+    assert posts_cache.stats()["bytes"] <= maxbytes
+
+
+def test_post_fragments(client):
+    """should build pages from cached post fragments and re-encode only the posts that changed."""
+
+    app = client.application
+    app.config["POSTS_CACHE_ENABLED"] = False
+    # fragments are compact JSON, debug mode indents responses and skips them.
+    app.debug = False
+    first = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        query_string={"authorIds": "2", "limit": 2},
+    ).data
+    assert post_fragments.stats()["misses"] == 2
+
+    second = client.get(
+        "/api/posts",
+        headers={"x-access-token": make_token(1)},
+        query_string={"authorIds": "2", "limit": 2},
+    ).data
+    assert second == first
+    assert post_fragments.stats()["hits"] == 2
+
+    app.config["POST_FRAGMENT_CACHE_ENABLED"] = False
+    assert (
+        client.get(
+            "/api/posts",
+            headers={"x-access-token": make_token(1)},
+            query_string={"authorIds": "2", "limit": 2},
+        ).data
+        == first
+    )
+    app.config["POST_FRAGMENT_CACHE_ENABLED"] = True
+
+    client.patch(
+        "/api/posts/1",
+        headers={"x-access-token": make_token(2)},
+        json={"tags": ["changed"]},
+    )
+    posts = get_posts(client, authorIds="2")["posts"]
+    assert [post["tags"] for post in posts][:2] == [["changed"], ["travel", "hotels"]]
+    assert post_fragments.stats()["misses"] == 4
@@ -0,0 +1,105 @@
+import json
+import threading
+
+from db.shared import db
+from db.models.role import Permission, Role
+from db.models.user_post import UserPost
+from tests.utils import make_token
+
+
+def patch_post(client, user_id, post_id, data):
+    return client.patch(
+        f"/api/posts/{post_id}",
+        headers={
+            "x-access-token": make_token(user_id),
+            "Content-Type": "application/json",
+        },
+        data=json.dumps(data),
+    )
+
+
+def test_editor_may_update_text_but_not_authors(client):
+    """should let an editor change text and refuse changes to the author list."""
+    response = patch_post(
+        client, 1, 1, {"authorIds": [1, 2], "authorRoles": {"2": "editor"}}
+    )
+    assert response.status_code == 200
+
+    response = patch_post(client, 2, 1, {"text": "edited by an editor"})
+    assert response.status_code == 200
+    assert response.json["post"]["text"] == "edited by an editor"
+
+    response = patch_post(client, 2, 1, {"authorIds": [2]})
+    assert response.status_code == 403
+
+
+def test_viewer_may_not_update_text(client):
+    """should refuse text changes from a viewer."""
+    patch_post(client, 2, 3, {"authorIds": [2, 3], "authorRoles": {"3": "viewer"}})
+
+    response = patch_post(client, 3, 3, {"text": "edited by a viewer"})
+
+    assert response.status_code == 403
+
+
+def test_post_keeps_at_least_one_owner(client):
+    """should refuse author changes that leave a post without an owner."""
+    response = patch_post(
+        client,
+        2,
+        2,
+        {"authorIds": [2, 3], "authorRoles": {"2": "editor", "3": "viewer"}},
+    )
+
+    assert response.status_code == 400
+    assert response.json == {"error": "A post must always have at least one owner."}
+    with client.application.app_context():
+        assert [
+            (m.user_id, m.role_id) for m in UserPost.query.filter_by(post_id=2)
+        ] == [(2, 1)]
+
+
+def test_unknown_role(client):
+    """should refuse roles that do not exist."""
+    response = patch_post(
+        client, 1, 1, {"authorIds": [1, 2], "authorRoles": {"2": "admin"}}
+    )
+
+    assert response.status_code == 400
+
+
+def test_role_cache_invalidated_on_change(client):
+    """should pick up new permissions of a role as soon as it changes."""
+    patch_post(client, 1, 1, {"authorIds": [1, 2], "authorRoles": {"2": "viewer"}})
+    assert patch_post(client, 2, 1, {"text": "not yet"}).status_code == 403
+
+    with client.application.app_context():
+        viewer = Role.query.filter_by(name="viewer").one()
+        viewer.permissions = int(Permission.READ | Permission.UPDATE)
+        db.session.commit()
+
+    assert patch_post(client, 2, 1, {"text": "now allowed"}).status_code == 200
+
+
+def test_role_cache_cleared_on_commit(client):
+    """should not keep definitions another thread cached between a role's flush and its commit."""
+    app = client.application
+
+    def cache_definitions():
+        with app.app_context():
+            Role.definitions()
+
+    with app.app_context():
+        viewer = Role.query.filter_by(name="viewer").one()
+        viewer.permissions = int(Permission.READ | Permission.UPDATE)
+        db.session.flush()
+
+        reader = threading.Thread(target=cache_definitions)
+        reader.start()
+        reader.join()
+        assert Role.definitions()[viewer.id][1] == int(Permission.READ)
+
+        db.session.commit()
+        assert Role.definitions()[viewer.id][1] == int(
+            Permission.READ | Permission.UPDATE
+        )
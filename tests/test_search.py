@@ -0,0 +1,56 @@
+import json
+
+from tests.utils import make_token
+
+
+def search(client, **query_string):
+    response = client.get(
+        "/api/posts/search",
+        headers={"x-access-token": make_token(1)},
+        query_string=query_string,
+    )
+    assert response.status_code == 200
+    return [post["id"] for post in response.json.get("posts", [])]
+
+
+def test_search_posts(client):
+    """should return the posts containing every search term, filtered by author and sorted."""
+
+    assert search(client, q="amet", sortBy="id") == [1, 2]
+    assert search(client, q="amet", sortBy="likes", direction="desc") == [2, 1]
+    assert search(client, q="amet lorem") == [2]
+    assert search(client, q="amet", authorIds="1") == [1]
+    assert search(client, q="amet", authorIds="3") == []
+    assert search(client, q='"amet* -') == [1, 2]
+
+    response = client.get(
+        "/api/posts/search",
+        headers={"x-access-token": make_token(1)},
+        query_string={"q": "amet", "sortBy": "tags"},
+    )
+    assert response.status_code == 400
+
+
+def test_search_index_follows_writes(client):
+    """should index created, bulk created and edited posts."""
+
+    token = make_token(3)
+    client.post(
+        "/api/posts",
+        headers={"x-access-token": token},
+        data=json.dumps({"text": "sunny beach"}),
+    )
+    client.post(
+        "/api/posts/bulk",
+        headers={"x-access-token": token},
+        data=json.dumps([{"text": "beach party"}]),
+    )
+    response = client.patch(
+        "/api/posts/4",
+        headers={"x-access-token": token, "Content-Type": "application/json"},
+        data=json.dumps({"text": "quiet beach"}),
+    )
+    assert response.status_code == 200
+
+    assert search(client, q="beach", sortBy="id") == [4, 5, 6]
+    assert search(client, q="post") == []
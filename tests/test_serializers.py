@@ -0,0 +1,46 @@
+from db.models.post import Post
+from db.models.user import User
+from db.serializers import serializer_for
+from db.utils import rows_to_list
+
+
+def test_post_serializer(client):
+    """should serialize posts with one cached serializer per field list and camelCase keys."""
+
+    with client.application.app_context():
+        assert serializer_for(Post) is serializer_for(Post)
+        assert Post.serializer(["id"], withUsers=True) is Post.serializer(
+            ["id"], withUsers=True
+        )
+
+        posts = Post.query.order_by(Post.id).all()
+        serialized = Post.serializer(["id", "tags"], withUsers=True).serialize_many(
+            posts
+        )
+        assert serialized[0] == {
+            "id": 1,
+            "tags": ["food", "recipes", "baking"],
+            "authorIds": [1, 2],
+        }
+        assert serialized == [
+            post.serialize(withUsers=True, fields=["id", "tags"]) for post in posts
+        ]
+        assert list(posts[3].serialize()) == [
+            "id",
+            "text",
+            "likes",
+            "reads",
+            "popularity",
+            "tags",
+        ]
+
+
+def test_rows_to_list(client):
+    """should serialize every column of each row."""
+
+    with client.application.app_context():
+        users = User.query.order_by(User.id).limit(2).all()
+        serialized = rows_to_list(users)
+        assert [user["username"] for user in serialized] == ["thomas", "santiago"]
+        assert "postsVersion" in serialized[0]
+        assert rows_to_list([]) == []
@@ -0,0 +1,98 @@
+import json
+
+import response_cache
+from db.counters import counters
+from db.shared import db
+from db.models.tag_count import TagCount
+from tests.utils import make_token
+
+
+def get_facets(client, **query_string):
+    response = client.get(
+        "/api/tags",
+        headers={"x-access-token": make_token(1)},
+        query_string=query_string,
+    )
+    assert response.status_code == 200
+    return {facet["tag"]: facet["count"] for facet in response.json["tags"]}
+
+
+def test_tag_facets(client):
+    """should count the posts of every tag, globally and for a set of authors."""
+
+    response = client.get(
+        "/api/tags",
+        headers={"x-access-token": make_token(1)},
+        query_string={"limit": 3},
+    )
+    assert response.json == {
+        "tags": [
+            {"tag": "travel", "count": 2},
+            {"tag": "vacation", "count": 2},
+            {"tag": "airbnb", "count": 1},
+        ]
+    }
+    assert get_facets(client, authorIds="1,3") == {
+        "vacation": 2,
+        "airbnb": 1,
+        "baking": 1,
+        "food": 1,
+        "recipes": 1,
+        "spa": 1,
+        "travel": 1,
+    }
+    # post 1 is written by both authors and counted once.
+    assert get_facets(client, authorIds="1,2")["food"] == 1
+    assert get_facets(client, authorIds="2,3")["travel"] == 2
+
+
+def test_multi_author_facets_cached_until_write(client):
+    """should serve repeated facets of several authors from the cache until one of them writes."""
+
+    cache = response_cache.tag_facets_cache
+    assert get_facets(client, authorIds="2,3")["travel"] == 2
+    assert get_facets(client, authorIds="3,2")["travel"] == 2
+    assert (cache.stats()["misses"], cache.stats()["hits"]) == (1, 1)
+
+    client.post("/api/posts/3/like", headers={"x-access-token": make_token(3)})
+    counters.flush()
+    assert get_facets(client, authorIds="2,3")["travel"] == 2
+    assert cache.stats()["hits"] == 2
+
+    response = client.patch(
+        "/api/posts/3",
+        headers={"x-access-token": make_token(3), "Content-Type": "application/json"},
+        data=json.dumps({"tags": ["vacation"]}),
+    )
+    assert response.status_code == 200
+    assert get_facets(client, authorIds="2,3")["travel"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_tag_counts_follow_writes(client):
+    """should keep the counters equal to a rebuild across creates, tag changes and author changes."""
+
+    token = make_token(3)
+    client.post(
+        "/api/posts",
+        headers={"x-access-token": token},
+        data=json.dumps({"text": "new post", "tags": ["spa", "new"]}),
+    )
+    response = client.patch(
+        "/api/posts/4",
+        headers={"x-access-token": token, "Content-Type": "application/json"},
+        data=json.dumps({"tags": ["new"], "authorIds": [3, 5]}),
+    )
+    assert response.status_code == 200
+    client.post(
+        "/api/posts/bulk",
+        headers={"x-access-token": token},
+        data=json.dumps([{"text": "bulk", "tags": ["new", "new"], "authorIds": [5]}]),
+    )
+
+    assert get_facets(client)["new"] == 3
+    assert get_facets(client)["spa"] == 1
+    assert get_facets(client, authorIds="5") == {"new": 2}
+    with client.application.app_context():
+        assert TagCount.rebuild() == 0
+        db.session.rollback()
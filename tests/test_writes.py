@@ -0,0 +1,197 @@
+import json
+import threading
+
+import pytest
+
+from db.shared import db
+from db.models.post import Post
+from db.writes import WriteQueueTimeout, writes
+from tests.utils import make_token
+
+
+def test_write_queue_batches_concurrent_writes(client):
+    """should commit concurrent writes in shared batches and return each caller its own result."""
+    app = client.application
+    app.config["WRITE_QUEUE_ENABLED"] = True
+    app.config["WRITE_QUEUE_MAX_WAIT_MS"] = 50
+    writes.init_app(app)
+    batches = writes.batches
+
+    results = {}
+
+    def create(i):
+        with app.app_context():
+            results[i] = writes.submit(Post.create, 1, f"queued post {i}", ["queued"])
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(20)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        app.config["WRITE_QUEUE_ENABLED"] = False
+        writes.init_app(app)
+
+    assert writes.batches - batches < 20
+    with app.app_context():
+        for i, post_id in results.items():
+            assert Post.query.get(post_id).text == f"queued post {i}"
+
+
+def test_write_queue_isolates_failing_job(client):
+    """should hand a failing job its own error without failing the rest of its batch."""
+    app = client.application
+    app.config["WRITE_QUEUE_ENABLED"] = True
+    app.config["WRITE_QUEUE_MAX_WAIT_MS"] = 50
+    writes.init_app(app)
+
+    outcomes = {}
+
+    def run(name, job, *args):
+        with app.app_context():
+            try:
+                outcomes[name] = writes.submit(job, *args)
+            except Exception as e:
+                outcomes[name] = e
+
+    threads = [
+        threading.Thread(target=run, args=("good", Post.create, 1, "fine", ["a"])),
+        threading.Thread(target=run, args=("bad", Post.create, 1, None, ["a"])),
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        app.config["WRITE_QUEUE_ENABLED"] = False
+        writes.init_app(app)
+
+    assert isinstance(outcomes["good"], int)
+    assert isinstance(outcomes["bad"], Exception)
+    with app.app_context():
+        assert Post.query.get(outcomes["good"]).text == "fine"
+
+
+def test_write_queue_survives_failed_batch(client, monkeypatch):
+    """should hand a batch's own failure to its callers and keep the writer thread serving."""
+    app = client.application
+    app.config["WRITE_QUEUE_ENABLED"] = True
+    writes.init_app(app)
+
+    def failing_rollback():
+        raise RuntimeError("rollback failed")
+
+    def fail():
+        raise ValueError("job failed")
+
+    try:
+        with app.app_context():
+            monkeypatch.setattr(db.session, "rollback", failing_rollback)
+            with pytest.raises(RuntimeError, match="rollback failed"):
+                writes.submit(fail)
+            monkeypatch.undo()
+            post_id = writes.submit(Post.create, 1, "after the failure", [])
+    finally:
+        app.config["WRITE_QUEUE_ENABLED"] = False
+        writes.init_app(app)
+
+    with app.app_context():
+        assert Post.query.get(post_id).text == "after the failure"
+
+
+def test_write_queue_timeout(client):
+    """should answer 503 when the writer thread does not take a write within WRITE_QUEUE_TIMEOUT_MS."""
+    app = client.application
+    app.config["WRITE_QUEUE_ENABLED"] = True
+    app.config["WRITE_QUEUE_TIMEOUT_MS"] = 50
+    writes.init_app(app)
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    blocker = threading.Thread(target=writes.submit, args=(block,))
+    blocker.start()
+    try:
+        assert started.wait(5)
+        with app.app_context():
+            with pytest.raises(WriteQueueTimeout):
+                writes.submit(Post.create, 1, "never written", [])
+        response = client.post(
+            "/api/posts",
+            headers={"x-access-token": make_token(1)},
+            data=json.dumps({"text": "never written", "tags": []}),
+        )
+        assert response.status_code == 503
+    finally:
+        release.set()
+        blocker.join()
+        app.config["WRITE_QUEUE_ENABLED"] = False
+        app.config["WRITE_QUEUE_TIMEOUT_MS"] = 30000
+        writes.init_app(app)
+
+    with app.app_context():
+        assert Post.query.filter_by(text="never written").count() == 0
+
+
+def test_concurrent_bulk_creates(client):
+    """should give concurrent bulk creates distinct ids instead of failing on a duplicate id."""
+    app = client.application
+    results = {}
+
+    def create(i):
+        with app.app_context():
+            try:
+                results[i] = writes.submit(
+                    Post.bulk_create,
+                    [{"text": f"bulk {i}", "tags": [], "author_ids": []}] * 300,
+                    1,
+                )
+            except Exception as e:
+                results[i] = e
+
+    threads = [threading.Thread(target=create, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    ids = [post_id for i in range(4) for post_id in results[i]]
+    assert len(set(ids)) == 1200
+    with app.app_context():
+        assert Post.query.get(results[3][0]).text == "bulk 3"
+
+
+def test_endpoints_through_write_queue(client):
+    """should serve register, create and update through the write queue."""
+    app = client.application
+    app.config["WRITE_QUEUE_ENABLED"] = True
+    writes.init_app(app)
+    try:
+        response = client.post(
+            "/api/register",
+            data=json.dumps(dict(username="queued", password="123456")),
+            content_type="application/json",
+        )
+        assert response.status_code == 200
+
+        response = client.post(
+            "/api/posts",
+            headers={"x-access-token": make_token(1)},
+            data=json.dumps({"text": "queued", "tags": ["a"]}),
+        )
+        post_id = response.json["id"]
+
+        response = client.patch(
+            f"/api/posts/{post_id}",
+            headers={"x-access-token": make_token(1)},
+            json={"text": "updated", "authorIds": [1, 6]},
+        )
+        assert response.json["post"]["text"] == "updated"
+        assert response.json["post"]["authorIds"] == [1, 6]
+    finally:
+        app.config["WRITE_QUEUE_ENABLED"] = False
+        writes.init_app(app)